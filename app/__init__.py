@@ -1,24 +1,40 @@
-from flask import Flask
-from flask_cors import CORS
+from flask import Flask, abort
 from flask_bcrypt import Bcrypt
 from app.config import Config
-import firebase_admin
-from firebase_admin import credentials, firestore
+import logging
 import os
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
 
 bcrypt = Bcrypt()
 db = None
+_db_pid = None
+_db_lock = threading.Lock()
 
 def create_app():
+    # Imports usados só aqui ficam fora do `import app` (cold start)
+    from flask_cors import CORS
+    from app.json_provider import get_json_provider_class
+    
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.json = get_json_provider_class(app.config['JSON_PROVIDER'])(app)
+    
+    # Logs JSON através de uma fila, com ID e duração da requisição
+    from app.structured_logging import configure_logging, init_request_logging
+    configure_logging(app.config['LOG_LEVEL'])
+    init_request_logging(app)
     
     # Inicializar extensões
     CORS(app)
     bcrypt.init_app(app)
     
-    # Inicializar Firebase
-    init_firebase()
+    # O Firebase é inicializado no primeiro uso (get_db), mantendo o
+    # cold start livre da stack google-cloud
+    if app.config.get('FIREBASE_EAGER_INIT'):
+        get_db()
     
     # Registrar blueprints
     from app.auth.routes import auth_bp
@@ -27,38 +43,137 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    if app.config.get('COMPRESS_ENABLED'):
+        from app.compression import CompressionMiddleware
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            min_size=app.config['COMPRESS_MIN_SIZE'],
+            level=app.config['COMPRESS_LEVEL'],
+            brotli_quality=app.config['COMPRESS_BROTLI_QUALITY'],
+            mimetypes=app.config['COMPRESS_MIMETYPES']
+        )
+    
+    from app.cli import register_commands
+    register_commands(app)
+    
+    # Assets com fingerprint e pré-comprimidos (app/static/build)
+    static_assets, asset_names = _load_static_assets(app)
+    
     # Rota principal
     @app.route('/')
     def index():
+        if static_assets is not None:
+            return static_assets.send_precompressed(static_assets.ENTRY_POINT, 'no-cache')
         return app.send_static_file('index.html')
     
+    @app.route('/assets/<path:filename>')
+    def assets(filename):
+        # Cache imutável só para arquivos com fingerprint listados no manifesto
+        if filename not in asset_names:
+            abort(404)
+        return static_assets.send_precompressed(filename, static_assets.IMMUTABLE_CACHE_CONTROL)
+    
     return app
 
+def _load_static_assets(app):
+    """(módulo static_assets, nomes com fingerprint), ou (None, vazio) sem build.
+
+    Com STATIC_ASSETS_BUILD o build é gerado/atualizado aqui; sem ele só é
+    usado um manifesto já gerado por `flask build-assets`, e o módulo (com
+    gzip/brotli) nem é importado quando não há build.
+    """
+    build = app.config.get('STATIC_ASSETS_BUILD')
+    if not build and not os.path.exists(os.path.join(app.static_folder, 'build', 'manifest.json')):
+        return None, frozenset()
+    from app import static_assets
+    try:
+        if build:
+            manifest = static_assets.ensure_assets(app.static_folder)
+        else:
+            manifest = static_assets.load_manifest(app.static_folder)
+    except OSError as e:
+        logger.error("Erro ao gerar assets estáticos: %s", e)
+        return None, frozenset()
+    if manifest is None:
+        return None, frozenset()
+    return static_assets, static_assets.fingerprinted_names(manifest)
+
 def init_firebase():
-    global db
+    global db, _db_pid
+    # Registrar o processo dono do cliente (ver get_db/reset_db)
+    _db_pid = os.getpid()
     try:
+        # Emulador do Firestore: sem credenciais reais
+        if Config.FIRESTORE_EMULATOR_HOST:
+            from google.auth.credentials import AnonymousCredentials
+            from app.firestore_client import create_client_pool
+            os.environ.setdefault('FIRESTORE_EMULATOR_HOST', Config.FIRESTORE_EMULATOR_HOST)
+            db = create_client_pool(Config.FIREBASE_PROJECT_ID or 'demo-project', AnonymousCredentials())
+            return
+        
+        # Sem credenciais, usar o simulador sem importar a stack google-cloud
+        if not os.path.exists(Config.FIREBASE_CREDENTIALS_PATH) and 'firebase_admin' not in sys.modules:
+            logger.info("Arquivo de credenciais do Firebase não encontrado; "
+                        "usando simulador local do Firestore para desenvolvimento")
+            from app.firestore_simulator import get_mock_firestore_client
+            db = get_mock_firestore_client()
+            return
+        
+        # Imports pesados só acontecem quando o Firebase real é usado
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        
         # Verificar se o Firebase já foi inicializado
         if not firebase_admin._apps:
             # Para desenvolvimento, usar credenciais de exemplo
             # Em produção, usar arquivo de credenciais real
-            if os.path.exists('firebase-credentials.json'):
-                cred = credentials.Certificate('firebase-credentials.json')
+            if os.path.exists(Config.FIREBASE_CREDENTIALS_PATH):
+                cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS_PATH)
                 firebase_admin.initialize_app(cred)
-                db = firestore.client()
+                db = _create_firestore_client()
             else:
-                print("Arquivo de credenciais do Firebase não encontrado.")
-                print("Usando simulador local do Firestore para desenvolvimento.")
+                logger.info("Arquivo de credenciais do Firebase não encontrado; "
+                            "usando simulador local do Firestore para desenvolvimento")
                 # Usar simulador local para desenvolvimento
                 from app.firestore_simulator import get_mock_firestore_client
                 db = get_mock_firestore_client()
         else:
-            db = firestore.client()
+            db = _create_firestore_client()
     except Exception as e:
-        print(f"Erro ao inicializar Firebase: {e}")
-        print("Usando simulador local do Firestore para desenvolvimento.")
+        logger.exception("Erro ao inicializar Firebase; usando simulador local do Firestore para desenvolvimento")
         # Para desenvolvimento, usar simulador local
         from app.firestore_simulator import get_mock_firestore_client
         db = get_mock_firestore_client()
 
+def _create_firestore_client():
+    """Criar um cliente Firestore novo para o processo atual.
+
+    firestore.client() guarda o cliente no app do firebase_admin, então um
+    worker criado por fork herdaria o canal gRPC do processo pai. Aqui o
+    cliente é sempre construído a partir das credenciais do app, com as
+    opções de canal e o pool definidos em Config.
+    """
+    import firebase_admin
+    from app.firestore_client import create_client_pool
+
+    firebase_app = firebase_admin.get_app()
+    return create_client_pool(firebase_app.project_id, firebase_app.credential.get_credential())
+
+def reset_db():
+    """Descartar o cliente herdado do processo pai (usar após fork)"""
+    global db, _db_pid
+    with _db_lock:
+        db = None
+        _db_pid = None
+    from app.firestore_simulator import reset_mock_firestore_client
+    reset_mock_firestore_client()
+    from app.models import user_cache
+    user_cache.clear()
+
 def get_db():
+    """Obter o cliente do banco, inicializando-o no primeiro uso em cada processo"""
+    if db is None or _db_pid != os.getpid():
+        with _db_lock:
+            if db is None or _db_pid != os.getpid():
+                init_firebase()
     return db
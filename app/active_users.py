@@ -0,0 +1,254 @@
+"""
+Usuários ativos aproximados com sketches HyperLogLog
+
+Cada requisição autenticada registra o UID em três anéis de sketches
+(por minuto, hora e dia). A memória é fixa: 2^precision bytes por bucket,
+independente do número de usuários (erro padrão ~1,04/sqrt(2^precision),
+1,6% com o padrão 12). Sketches são combináveis pelo máximo de cada
+registrador, então os workers publicam os seus no backend e a leitura
+combina os de todos, sem contar duas vezes quem passou por vários workers.
+"""
+
+import base64
+import hashlib
+import importlib
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# (nome, duração do bucket em segundos, buckets mantidos)
+GRANULARITIES = (
+    ('minute', 60, 60),
+    ('hour', 3600, 24),
+    ('day', 86400, 7),
+)
+
+# Janelas expostas: (granularidade, número de buckets mais recentes)
+WINDOWS = {
+    'last_5_minutes': ('minute', 5),
+    'last_hour': ('minute', 60),
+    'last_24_hours': ('hour', 24),
+    'last_7_days': ('day', 7),
+}
+
+def _hash64(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HyperLogLog:
+    """Sketch HyperLogLog com hash de 64 bits (sem correção de faixa alta)"""
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add_hash(self, value):
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, key):
+        self.add_hash(_hash64(key))
+
+    def merge(self, other):
+        """Combinar com outro sketch (máximo de cada registrador)"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Correção para cardinalidades pequenas (linear counting)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_text(self):
+        return base64.b64encode(bytes(self.registers)).decode('ascii')
+
+    @classmethod
+    def from_text(cls, text, precision):
+        return cls(precision, base64.b64decode(text))
+
+class MemoryActiveUsersBackend:
+    """Backend local: cada worker só enxerga os próprios sketches"""
+
+    shared = False
+
+    def publish(self, bucket_id, worker_id, sketch, expires_at):
+        pass
+
+    def fetch(self, bucket_ids, precision):
+        return {}
+
+class FirestoreActiveUsersBackend:
+    """Um documento por bucket em `active_users`, com um campo por worker.
+
+    Documentos vencidos podem ser removidos por uma política de TTL do
+    Firestore sobre o campo `expires_at`.
+    """
+
+    collection_name = 'active_users'
+    shared = True
+
+    def publish(self, bucket_id, worker_id, sketch, expires_at):
+        from app import get_db
+        from app.firestore_client import call_firestore
+        ref = get_db().collection(self.collection_name).document(bucket_id)
+        call_firestore(ref.set, {f'w_{worker_id}': sketch.to_text(), 'expires_at': expires_at}, merge=True)
+
+    def fetch(self, bucket_ids, precision):
+        """{bucket_id: [sketches dos workers]}"""
+        from app import get_db
+        from app.firestore_client import call_firestore
+        db = get_db()
+        refs = [db.collection(self.collection_name).document(bucket_id) for bucket_id in bucket_ids]
+        docs = call_firestore(lambda **options: list(db.get_all(refs, **options)))
+        sketches = {}
+        for doc in docs:
+            data = doc.to_dict() or {}
+            sketches[doc.id] = [HyperLogLog.from_text(value, precision)
+                                for field, value in data.items() if field.startswith('w_')]
+        return sketches
+
+class ActiveUserTracker:
+    """Anéis de sketches por minuto/hora/dia com sincronização entre workers"""
+
+    def __init__(self, backend=None, precision=12, sync_interval=10.0):
+        self.backend = backend or MemoryActiveUsersBackend()
+        self.precision = precision
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._buckets = {name: {} for name, _, _ in GRANULARITIES}
+        self._dirty = set()
+        self._estimates = None
+        self._worker_pid = None
+        self._worker_id = None
+
+    @staticmethod
+    def bucket_id(granularity, index):
+        return f"{granularity}-{index}"
+
+    def record(self, uid, now=None):
+        """Registrar atividade do usuário (só memória; O(1))"""
+        self._ensure_worker()
+        now = now or time.time()
+        value = _hash64(uid)
+        with self._lock:
+            for name, seconds, keep in GRANULARITIES:
+                index = int(now // seconds)
+                buckets = self._buckets[name]
+                sketch = buckets.get(index)
+                if sketch is None:
+                    sketch = buckets[index] = HyperLogLog(self.precision)
+                    # Descartar buckets fora do anel
+                    for old in [i for i in buckets if i <= index - keep]:
+                        del buckets[old]
+                sketch.add_hash(value)
+                self._dirty.add((name, index))
+
+    def _ensure_worker(self):
+        """Iniciar a thread de publicação uma vez por processo (seguro após fork)"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            # Sketches herdados por fork pertencem ao processo pai
+            self._reset()
+            self._worker_pid = os.getpid()
+            self._worker_id = uuid.uuid4().hex[:12]
+        if self.backend.shared:
+            thread = threading.Thread(target=self._run, name='active-users-sync', daemon=True)
+            thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sync_interval)
+            self.publish()
+
+    def publish(self):
+        """Publicar no backend os buckets alterados desde a última publicação"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshot = [(name, index, HyperLogLog(self.precision, self._buckets[name][index].registers))
+                        for name, index in dirty if index in self._buckets[name]]
+        durations = {name: (seconds, keep) for name, seconds, keep in GRANULARITIES}
+        for name, index, sketch in snapshot:
+            seconds, keep = durations[name]
+            expires_at = (index + keep + 1) * seconds
+            try:
+                self.backend.publish(self.bucket_id(name, index), self._worker_id, sketch, expires_at)
+            except Exception as e:
+                logger.error("Erro ao publicar usuários ativos: %s", e)
+                with self._lock:
+                    self._dirty.add((name, index))
+
+    def estimates(self, now=None):
+        """Usuários distintos estimados por janela, combinando todos os workers.
+
+        Com backend compartilhado o resultado fica em cache por
+        `sync_interval` segundos, que é também o atraso da publicação.
+        """
+        self._ensure_worker()
+        now = now or time.time()
+        cached = self._estimates
+        if cached is not None and now - cached[0] < self.sync_interval:
+            return cached[1]
+
+        durations = {name: seconds for name, seconds, _ in GRANULARITIES}
+        wanted = {}
+        for window, (name, count) in WINDOWS.items():
+            current = int(now // durations[name])
+            wanted[window] = [(name, index) for index in range(current - count + 1, current + 1)]
+
+        remote = {}
+        if self.backend.shared:
+            bucket_ids = {self.bucket_id(name, index) for keys in wanted.values() for name, index in keys}
+            try:
+                remote = self.backend.fetch(sorted(bucket_ids), self.precision)
+            except Exception as e:
+                logger.error("Erro ao ler usuários ativos: %s", e)
+
+        result = {}
+        with self._lock:
+            for window, keys in wanted.items():
+                merged = HyperLogLog(self.precision)
+                for name, index in keys:
+                    local = self._buckets[name].get(index)
+                    if local is not None:
+                        merged.merge(local)
+                    for sketch in remote.get(self.bucket_id(name, index), ()):
+                        merged.merge(sketch)
+                result[window] = merged.count()
+        self._estimates = (now, result)
+        return result
+
+def _load_backend(name):
+    """'memory', 'firestore' ou 'modulo:Classe' para um backend próprio"""
+    if name == 'memory':
+        return MemoryActiveUsersBackend()
+    if name == 'firestore':
+        return FirestoreActiveUsersBackend()
+    module_name, _, class_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+active_users = ActiveUserTracker(
+    _load_backend(Config.ACTIVE_USERS_BACKEND),
+    precision=Config.ACTIVE_USERS_PRECISION,
+    sync_interval=Config.ACTIVE_USERS_SYNC_INTERVAL
+)
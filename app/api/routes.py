@@ -1,10 +1,21 @@
-from flask import Blueprint, request, jsonify
-from app.decorators import authentication_required, optional_authentication
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from app.decorators import authentication_required, optional_authentication, conditional_user_response, permission_required
+from app.models import User
+from app.permissions import Permission, change_roles
+from app.serializers import public_user, SUMMARY_USER_FIELDS, LISTABLE_USER_FIELDS
+from app.microcache import micro_cached
+from app.login_stats import user_login_stats
+from app.user_stats import user_stats, summarize
+from app.active_users import active_users
+from app.audit import audit_log
+from app.user_export import export_users, export_filename, FORMATS as EXPORT_FORMATS
 from datetime import datetime
+from itertools import islice
 
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/public', methods=['GET'])
+@micro_cached
 def public_endpoint():
     """Public endpoint that doesn't require authentication"""
     return jsonify({
@@ -28,11 +39,7 @@ def protected_endpoint():
         'message': 'Access authorized to protected endpoint',
         'data': {
             'timestamp': datetime.utcnow().isoformat(),
-            'user': {
-                'uid': user.uid,
-                'email': user.email,
-                'name': user.name
-            },
+            'user': public_user(user, SUMMARY_USER_FIELDS),
             'description': 'This endpoint can only be accessed with a valid token',
             'protected': True
         }
@@ -40,9 +47,11 @@ def protected_endpoint():
 
 @api_bp.route('/user-data', methods=['GET'])
 @authentication_required
+@conditional_user_response('user-data', extra=lambda user: user_login_stats(user)[0])
 def get_user_data():
     """Endpoint to get specific user data"""
     user = request.current_user
+    login_count, last_login = user_login_stats(user)
     
     # Simulate user-specific data
     user_data = {
@@ -60,8 +69,8 @@ def get_user_data():
             'notifications': True
         },
         'stats': {
-            'login_count': 1,
-            'last_login': datetime.utcnow().isoformat()
+            'login_count': login_count,
+            'last_login': last_login.isoformat() if last_login else None
         }
     }
     
@@ -73,39 +82,167 @@ def get_user_data():
 
 @api_bp.route('/admin', methods=['GET'])
 @authentication_required
+@permission_required(Permission.VIEW_ADMIN)
 def admin_endpoint():
     """Administrative endpoint (simulated)"""
     user = request.current_user
     
-    # Simulate admin permission check
-    # In a real system, you would check roles/permissions in the database
-    is_admin = user.email.endswith('@admin.com')  # Simple simulation
-    
-    if not is_admin:
-        return jsonify({
-            'success': False,
-            'message': 'Access denied. Administrator permissions required.'
-        }), 403
-    
     return jsonify({
         'success': True,
         'message': 'Access authorized to admin panel',
         'data': {
             'timestamp': datetime.utcnow().isoformat(),
-            'admin_user': {
-                'uid': user.uid,
-                'email': user.email,
-                'name': user.name
-            },
+            'admin_user': public_user(user, SUMMARY_USER_FIELDS),
             'admin_data': {
-                'total_users': 42,  # Simulated data
-                'active_sessions': 15,
+                # Sharded counters maintained by User.save (no collection scan)
+                **summarize(user_stats.totals()),
+                # Distinct authenticated users per window (HyperLogLog estimates)
+                'active_users': active_users.estimates(),
+                # Audit pipeline queue depth, drops and flush latency (this worker)
+                'audit_pipeline': audit_log.metrics(),
                 'system_status': 'operational'
             }
         }
     }), 200
 
+def requested_fields(name, default):
+    """Comma-separated user fields from the query string: (fields, error response)"""
+    value = request.args.get(name)
+    fields = tuple(field.strip() for field in value.split(',') if field.strip()) if value else default
+    unknown = [field for field in fields if field not in LISTABLE_USER_FIELDS]
+    if unknown:
+        return None, (jsonify({
+            'success': False,
+            'message': f'Unknown fields: {", ".join(unknown)}'
+        }), 400)
+    return fields, None
+
+@api_bp.route('/admin/users', methods=['GET'])
+@authentication_required
+@permission_required(Permission.LIST_USERS)
+def admin_list_users():
+    """List users ordered by UID, one page per cursor or as an NDJSON stream.
+
+    Query parameters: `limit` (page size), `cursor` (UID to start after),
+    `fields` (comma-separated projection) and `format=ndjson` to stream
+    every user from the cursor on. Password hashes are never read.
+    """
+    fields, error = requested_fields('fields', LISTABLE_USER_FIELDS)
+    if error:
+        return error
+    
+    try:
+        limit = int(request.args.get('limit', current_app.config['ADMIN_USERS_PAGE_SIZE']))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= current_app.config['ADMIN_USERS_MAX_PAGE_SIZE']:
+        return jsonify({
+            'success': False,
+            'message': f'limit must be between 1 and {current_app.config["ADMIN_USERS_MAX_PAGE_SIZE"]}'
+        }), 400
+    
+    cursor = request.args.get('cursor') or None
+    
+    if request.args.get('format') == 'ndjson':
+        # One Firestore page in memory at a time, whatever the collection size
+        def generate():
+            for data in User.scan(fields, limit, cursor):
+                yield current_app.json.dumps(data) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    users = list(islice(User.scan(fields, limit, cursor), limit))
+    
+    return jsonify({
+        'success': True,
+        'message': 'Users retrieved successfully',
+        'data': {
+            'users': users,
+            'next_cursor': users[-1]['uid'] if len(users) == limit else None
+        }
+    }), 200
+
+@api_bp.route('/admin/users/export', methods=['GET'])
+@authentication_required
+@permission_required(Permission.EXPORT_USERS)
+def admin_export_users():
+    """Download every user as NDJSON or CSV, optionally gzip-compressed.
+
+    Query parameters: `format` (ndjson or csv), `fields` (projection),
+    `redact` (fields replaced by a stable hash) and `gzip=1`.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': f'format must be one of: {", ".join(EXPORT_FORMATS)}'
+        }), 400
+    
+    fields, error = requested_fields('fields', LISTABLE_USER_FIELDS)
+    if error:
+        return error
+    redact, error = requested_fields('redact', ())
+    if error:
+        return error
+    
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    if compress:
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    
+    response = Response(
+        export_users(fmt, fields, redact, compress, current_app.config['ADMIN_USERS_MAX_PAGE_SIZE']),
+        mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@api_bp.route('/admin/users/<uid>/roles', methods=['PUT'])
+@authentication_required
+@permission_required(Permission.MANAGE_ROLES)
+def admin_set_roles(uid):
+    """Replace a user's roles; their current access tokens stop working"""
+    data = request.get_json(silent=True)
+    if not data or 'roles' not in data:
+        return jsonify({
+            'success': False,
+            'message': 'roles is required'
+        }), 400
+    
+    user = User.find_by_uid(uid)
+    if not user:
+        return jsonify({
+            'success': False,
+            'message': 'User not found'
+        }), 404
+    
+    try:
+        changed = change_roles(user, data['roles'])
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'message': 'Roles updated' if changed else 'Roles unchanged',
+        'data': {
+            'uid': user.uid,
+            'roles': user.roles,
+            'permissions': user.permissions
+        }
+    }), 200
+
 @api_bp.route('/mixed', methods=['GET'])
+@micro_cached
 @optional_authentication
 def mixed_endpoint():
     """Endpoint that works with or without authentication"""
@@ -119,11 +256,7 @@ def mixed_endpoint():
             'data': {
                 'timestamp': datetime.utcnow().isoformat(),
                 'authenticated': True,
-                'user': {
-                    'uid': user.uid,
-                    'email': user.email,
-                    'name': user.name
-                },
+                'user': public_user(user, SUMMARY_USER_FIELDS),
                 'personalized_content': [
                     'Welcome back, ' + user.name + '!',
                     'You have 3 pending notifications',
@@ -170,16 +303,12 @@ def test_token():
         
         # Test token using validation endpoint
         import jwt
-        from flask import current_app
         from app.models import User
+        from app.tokens import decode_token, RevokedTokenError
         
         try:
-            # Decode JWT token
-            payload = jwt.decode(
-                token, 
-                current_app.config['JWT_SECRET_KEY'], 
-                algorithms=['HS256']
-            )
+            # Decode JWT token (checks type and revocation)
+            payload = decode_token(token)
             
             # Find user in database
             user = User.find_by_uid(payload['user_id'])
@@ -195,11 +324,7 @@ def test_token():
                 'message': 'Token is valid',
                 'test_result': 'PASS - Token is valid',
                 'data': {
-                    'user': {
-                        'uid': user.uid,
-                        'email': user.email,
-                        'name': user.name
-                    },
+                    'user': public_user(user, SUMMARY_USER_FIELDS),
                     'token_info': {
                         'expires_at': datetime.fromtimestamp(payload['exp']).isoformat(),
                         'issued_at': datetime.fromtimestamp(payload['iat']).isoformat()
@@ -213,6 +338,12 @@ def test_token():
                 'message': 'Token expired',
                 'test_result': 'FAIL - Token expired'
             }), 401
+        except RevokedTokenError:
+            return jsonify({
+                'success': False,
+                'message': 'Token revoked',
+                'test_result': 'FAIL - Token revoked'
+            }), 401
         except jwt.InvalidTokenError:
             return jsonify({
                 'success': False,
@@ -0,0 +1,229 @@
+"""
+Trilha de auditoria de autenticação com gravação assíncrona em lote
+
+Os handlers de autenticação chamam `audit_log.record(...)`, que só coloca o
+evento em uma fila limitada em memória. Uma thread em segundo plano retira
+até `batch_size` eventos por vez e grava cada lote com uma única operação:
+um WriteBatch do Firestore (coleção `audit_events`) ou um append em arquivo
+JSONL com rotação por tamanho.
+
+Quando a fila enche, a política de backpressure decide o que acontece:
+- drop: descarta o evento novo sem esperar;
+- block: espera até `block_timeout` segundos por espaço e então descarta;
+- sample: acima de metade da capacidade mantém só `sample_rate` dos eventos.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Limite de escritas por WriteBatch no Firestore
+MAX_BATCH_WRITES = 500
+
+POLICIES = ('drop', 'block', 'sample')
+
+class FirestoreAuditSink:
+    """Um documento por evento em `audit_events`, gravados em WriteBatch"""
+
+    collection_name = 'audit_events'
+
+    def write(self, events):
+        from app import get_db
+        from app.firestore_client import call_firestore
+        db = get_db()
+        collection = db.collection(self.collection_name)
+        batch = db.batch()
+        for event in events:
+            batch.set(collection.document(event['id']), event)
+        call_firestore(batch.commit)
+
+class JsonlAuditSink:
+    """Um arquivo JSONL por processo, rotacionado ao passar de `max_bytes`"""
+
+    def __init__(self, directory, max_bytes=10 * 1024 * 1024, backups=5):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def _path(self):
+        # Arquivo por PID: workers não disputam o mesmo arquivo na rotação
+        return os.path.join(self.directory, f'audit-{os.getpid()}.jsonl')
+
+    def write(self, events):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path()
+        lines = ''.join(json.dumps(event, default=_json_default) + '\n' for event in events)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+        if os.path.getsize(path) >= self.max_bytes:
+            self._rotate(path)
+
+    def _rotate(self, path):
+        stamp = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+        os.replace(path, f'{path[:-len(".jsonl")]}.{stamp}.jsonl')
+        rotated = sorted(glob.glob(f'{path[:-len(".jsonl")]}.*.jsonl'))
+        for old in rotated[:-self.backups] if self.backups else rotated:
+            os.remove(old)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class AuditPipeline:
+    """Fila limitada de eventos com uma thread gravando em lotes"""
+
+    def __init__(self, sink, capacity=10000, policy='drop', sample_rate=0.1,
+                 batch_size=MAX_BATCH_WRITES, flush_interval=1.0, block_timeout=0.05):
+        if policy not in POLICIES:
+            raise ValueError(f"Política de backpressure inválida: {policy}")
+        self.sink = sink
+        self.capacity = capacity
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.batch_size = min(batch_size, MAX_BATCH_WRITES)
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.capacity)
+        self._worker_pid = None
+        self._counters = {'enqueued': 0, 'written': 0, 'dropped': 0, 'sampled_out': 0, 'failed': 0}
+        self._flushes = 0
+        self._flush_seconds_total = 0.0
+        self._flush_seconds_last = 0.0
+        self._flush_seconds_max = 0.0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def record(self, event_type, uid=None, **details):
+        """Enfileirar um evento; retorna False se a backpressure o descartou"""
+        self._ensure_worker()
+        if self.policy == 'sample' and self._queue.qsize() >= self.capacity // 2:
+            if random.random() >= self.sample_rate:
+                self._count('sampled_out')
+                return False
+        event = {
+            'id': uuid.uuid4().hex,
+            'type': event_type,
+            'uid': uid,
+            'timestamp': datetime.utcnow(),
+            **details
+        }
+        try:
+            if self.policy == 'block':
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def _ensure_worker(self):
+        """Iniciar a thread de gravação uma vez por processo (seguro após fork)"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            # Fila e métricas herdadas por fork pertencem ao processo pai
+            pid = os.getpid()
+            self._reset()
+            self._worker_pid = pid
+        thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain([first]))
+
+    def _drain(self, events):
+        while len(events) < self.batch_size:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _write(self, events):
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                self.sink.write(events)
+            except Exception as e:
+                logger.error("Erro ao gravar eventos de auditoria: %s", e, extra={'events': len(events)})
+                self._count('failed', len(events))
+                return
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._counters['written'] += len(events)
+                self._flushes += 1
+                self._flush_seconds_total += elapsed
+                self._flush_seconds_last = elapsed
+                self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+
+    def flush(self):
+        """Gravar tudo o que está na fila (encerramento do processo)"""
+        if self._worker_pid != os.getpid():
+            return
+        while not self._queue.empty():
+            events = self._drain([])
+            if not events:
+                break
+            self._write(events)
+
+    def metrics(self):
+        """Profundidade da fila, contadores e latência das gravações (ms)"""
+        with self._lock:
+            flushes = self._flushes
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self.capacity,
+                'policy': self.policy,
+                **self._counters,
+                'flushes': flushes,
+                'flush_latency_ms': {
+                    'last': round(self._flush_seconds_last * 1000, 3),
+                    'avg': round(self._flush_seconds_total * 1000 / flushes, 3) if flushes else 0.0,
+                    'max': round(self._flush_seconds_max * 1000, 3)
+                }
+            }
+
+def _load_sink(name):
+    if name == 'jsonl':
+        return JsonlAuditSink(Config.AUDIT_LOG_DIR, Config.AUDIT_LOG_MAX_BYTES, Config.AUDIT_LOG_BACKUPS)
+    return FirestoreAuditSink()
+
+audit_log = AuditPipeline(
+    _load_sink(Config.AUDIT_SINK),
+    capacity=Config.AUDIT_QUEUE_SIZE,
+    policy=Config.AUDIT_BACKPRESSURE,
+    sample_rate=Config.AUDIT_SAMPLE_RATE,
+    flush_interval=Config.AUDIT_FLUSH_INTERVAL
+)
+
+# Encerramento normal do processo (servidor de desenvolvimento, CLI)
+atexit.register(audit_log.flush)
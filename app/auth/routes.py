@@ -1,33 +1,45 @@
-from flask import Blueprint, request, jsonify, current_app, session, redirect, url_for
+from flask import Blueprint, request, jsonify, current_app, session, redirect, url_for, g
+import hashlib
+import hmac
 import jwt
-from datetime import datetime, timedelta
 import uuid
-import requests
-from requests_oauthlib import OAuth2Session
-from app.models import User
-from app.decorators import authentication_required
+from app.models import User, EmailInUseError
+from app.idempotency import registration_requests, IdempotencyConflict
+from app.decorators import authentication_required, conditional_user_response
+from app.serializers import public_user
+from app.login_stats import login_stats
+from app.audit import audit_log
+from app.tokens import (
+    generate_jwt_token, generate_refresh_token, decode_token, revoke_token,
+    rotate_refresh_token, RevokedTokenError, REFRESH_TOKEN
+)
 
 auth_bp = Blueprint('auth', __name__)
 
-def generate_jwt_token(user_id):
-    """Generate JWT token for user"""
-    payload = {
-        'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(seconds=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']),
-        'iat': datetime.utcnow()
-    }
-    
-    token = jwt.encode(
-        payload,
-        current_app.config['JWT_SECRET_KEY'],
-        algorithm='HS256'
+EMAIL_IN_USE = (409, 'Email is already in use', None)
+
+def audit(event_type, uid=None, **details):
+    """Queue an audit event with the client address (written in the background)"""
+    audit_log.record(
+        event_type, uid,
+        ip=request.remote_addr,
+        user_agent=request.headers.get('User-Agent'),
+        **details
     )
-    
-    return token
+
+def registration_fingerprint(email, password, name):
+    """HMAC of the registration fields: identifies repeats without keeping the password"""
+    message = '\0'.join((email, password, name)).encode('utf-8')
+    return hmac.new(current_app.config['SECRET_KEY'].encode('utf-8'), message, hashlib.sha256).hexdigest()
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
-    """Register new user with email and password"""
+    """Register new user with email and password
+
+    Idempotent: requests with the same Idempotency-Key header (or, without
+    one, the same fields) run once; concurrent duplicates wait for the first
+    and repeats get its stored outcome with freshly issued tokens.
+    """
     try:
         data = request.get_json()
         
@@ -54,74 +66,48 @@ def register():
                 'message': 'Password must be at least 6 characters long'
             }), 400
         
-        # Check if user already exists
-        existing_user = User.find_by_email(email)
-        if existing_user:
-            # If user exists and was created via Google without a password, allow setting password
-            if existing_user.google_id and not existing_user.has_password:
-                existing_user.set_password(password)
-                existing_user.name = name or existing_user.name # Update name if provided
-                if existing_user.save():
-                    token = generate_jwt_token(existing_user.uid)
-                    return jsonify({
-                        'success': True,
-                        'message': 'Password set for Google-linked account',
-                        'data': {
-                            'user': {
-                                'uid': existing_user.uid,
-                                'email': existing_user.email,
-                                'name': existing_user.name,
-                                'has_password': existing_user.has_password,
-                                'google_id': existing_user.google_id is not None
-                            },
-                            'token': token
-                        }
-                    }), 200
-                else:
-                    return jsonify({
-                        'success': False,
-                        'message': 'Error updating Google-linked account'
-                    }), 500
-            else:
-                # Otherwise, email is genuinely in use
+        fingerprint = registration_fingerprint(email, password, name)
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()[:255]
+        key = f'key:{idempotency_key}' if idempotency_key else f'request:{fingerprint}'
+        try:
+            (status, message, uid), replayed = registration_requests.run(
+                key, fingerprint, lambda: register_user(email, password, name),
+                cacheable=lambda outcome: outcome[0] < 500
+            )
+        except IdempotencyConflict:
+            return jsonify({
+                'success': False,
+                'message': 'Idempotency-Key was already used with a different request'
+            }), 422
+        except TimeoutError:
+            return jsonify({
+                'success': False,
+                'message': 'A request with this Idempotency-Key is still in progress'
+            }), 409
+        
+        if uid is None:
+            response = jsonify({'success': False, 'message': message})
+        else:
+            # Only the outcome is stored: every response gets its own tokens, so a
+            # replay never hands out a refresh token the client may already have rotated
+            user = g.pop('registered_user', None) if not replayed else User.find_by_uid(uid)
+            if user is None:
                 return jsonify({
                     'success': False,
-                    'message': 'Email is already in use'
-                }), 409
-        
-        # Create new user
-        user_id = str(uuid.uuid4())
-        user = User(
-            uid=user_id,
-            email=email,
-            name=name or email.split('@')[0],
-            has_password=True
-        )
-        user.set_password(password)
-        
-        # Save to database
-        if user.save():
-            # Generate JWT token
-            token = generate_jwt_token(user_id)
-            
-            return jsonify({
+                    'message': 'User not found'
+                }), 500
+            response = jsonify({
                 'success': True,
-                'message': 'User registered successfully',
+                'message': message,
                 'data': {
-                    'user': {
-                        'uid': user.uid,
-                        'email': user.email,
-                        'name': user.name,
-                        'has_password': user.has_password
-                    },
-                    'token': token
+                    'user': public_user(user),
+                    'token': generate_jwt_token(user),
+                    'refresh_token': generate_refresh_token(user.uid)
                 }
-            }), 201
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Error saving user'
-            }), 500
+            })
+        if replayed:
+            response.headers['Idempotent-Replayed'] = 'true'
+        return response, status
             
     except Exception as e:
         return jsonify({
@@ -129,6 +115,52 @@ def register():
             'message': f'Internal error: {str(e)}'
         }), 500
 
+def register_user(email, password, name):
+    """Create the user (or set the password of a Google-only account).
+
+    Returns the outcome (status, message, uid or None); the user object is
+    left in g.registered_user for the response.
+    """
+    # Check if user already exists
+    existing_user = User.find_by_email(email)
+    if existing_user:
+        # If user exists and was created via Google without a password, allow setting password
+        if existing_user.google_id and not existing_user.has_password:
+            existing_user.set_password(password)
+            existing_user.name = name or existing_user.name # Update name if provided
+            if existing_user.save():
+                audit('set_password', existing_user.uid, source='register')
+                g.registered_user = existing_user
+                return 200, 'Password set for Google-linked account', existing_user.uid
+            else:
+                return 500, 'Error updating Google-linked account', None
+        else:
+            # Otherwise, email is genuinely in use
+            return EMAIL_IN_USE
+    
+    # Create new user
+    user_id = str(uuid.uuid4())
+    user = User(
+        uid=user_id,
+        email=email,
+        name=name or email.split('@')[0],
+        has_password=True
+    )
+    user.set_password(password)
+    
+    # Create the user and reserve the email in one atomic write
+    try:
+        created = user.create()
+    except EmailInUseError:
+        # A concurrent registration reserved the email first
+        return EMAIL_IN_USE
+    if created:
+        audit('register', user_id, method='password')
+        g.registered_user = user
+        return 201, 'User registered successfully', user_id
+    else:
+        return 500, 'Error saving user', None
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Login with email and password"""
@@ -153,6 +185,7 @@ def login():
         # Find user
         user = User.find_by_email(email)
         if not user:
+            audit('login_failed', email=email, reason='unknown_email')
             return jsonify({
                 'success': False,
                 'message': 'Invalid credentials'
@@ -160,25 +193,26 @@ def login():
         
         # Check password
         if not user.check_password(password):
+            audit('login_failed', user.uid, email=email, reason='wrong_password')
             return jsonify({
                 'success': False,
                 'message': 'Invalid credentials'
             }), 401
         
+        # Count the login (buffered, written in batches)
+        login_stats.record_login(user.uid)
+        audit('login', user.uid, method='password')
+        
         # Generate JWT token
-        token = generate_jwt_token(user.uid)
+        token = generate_jwt_token(user)
         
         return jsonify({
             'success': True,
             'message': 'Login successful',
             'data': {
-                'user': {
-                    'uid': user.uid,
-                    'email': user.email,
-                    'name': user.name,
-                    'has_password': user.has_password
-                },
-                'token': token
+                'user': public_user(user),
+                'token': token,
+                'refresh_token': generate_refresh_token(user.uid)
             }
         }), 200
         
@@ -220,16 +254,12 @@ def set_password():
         
         # Update password
         if user.update_password(password):
+            audit('set_password', user.uid, source='set-password')
             return jsonify({
                 'success': True,
                 'message': 'Password set successfully',
                 'data': {
-                    'user': {
-                        'uid': user.uid,
-                        'email': user.email,
-                        'name': user.name,
-                        'has_password': True
-                    }
+                    'user': public_user(user)
                 }
             }), 200
         else:
@@ -246,6 +276,7 @@ def set_password():
 
 @auth_bp.route('/profile', methods=['GET'])
 @authentication_required
+@conditional_user_response('profile')
 def get_profile():
     """Get authenticated user profile"""
     try:
@@ -254,13 +285,7 @@ def get_profile():
         return jsonify({
             'success': True,
             'data': {
-                'user': {
-                    'uid': user.uid,
-                    'email': user.email,
-                    'name': user.name,
-                    'has_password': user.has_password,
-                    'google_id': user.google_id is not None
-                }
+                'user': public_user(user)
             }
         }), 200
         
@@ -291,12 +316,8 @@ def validate_token():
             }), 400
         
         try:
-            # Decode JWT token
-            payload = jwt.decode(
-                token, 
-                current_app.config['JWT_SECRET_KEY'], 
-                algorithms=['HS256']
-            )
+            # Decode JWT token (checks type and revocation)
+            payload = decode_token(token)
             
             # Find user in database
             user = User.find_by_uid(payload['user_id'])
@@ -310,13 +331,9 @@ def validate_token():
                 'success': True,
                 'message': 'Token is valid',
                 'data': {
-                    'user': {
-                        'uid': user.uid,
-                        'email': user.email,
-                        'name': user.name,
-                        'has_password': user.has_password,
-                        'google_id': user.google_id is not None
-                    }
+                    'user': public_user(user),
+                    # Clients may skip revalidating this token for this many seconds
+                    'revalidate_after': current_app.config['TOKEN_REVALIDATE_AFTER']
                 }
             }), 200
             
@@ -325,6 +342,11 @@ def validate_token():
                 'success': False,
                 'message': 'Token expired'
             }), 401
+        except RevokedTokenError:
+            return jsonify({
+                'success': False,
+                'message': 'Token revoked'
+            }), 401
         except jwt.InvalidTokenError:
             return jsonify({
                 'success': False,
@@ -337,11 +359,87 @@ def validate_token():
             'message': f'Internal error: {str(e)}'
         }), 500
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Exchange a refresh token for a new access token and a rotated refresh token"""
+    try:
+        data = request.get_json(silent=True)
+        refresh_token = (data or {}).get('refresh_token', '')
+        
+        if not refresh_token:
+            return jsonify({
+                'success': False,
+                'message': 'Refresh token not provided'
+            }), 400
+        
+        try:
+            user_id, token, new_refresh_token = rotate_refresh_token(refresh_token)
+        except jwt.ExpiredSignatureError:
+            return jsonify({
+                'success': False,
+                'message': 'Refresh token expired'
+            }), 401
+        except RevokedTokenError:
+            return jsonify({
+                'success': False,
+                'message': 'Refresh token revoked'
+            }), 401
+        except jwt.InvalidTokenError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid refresh token'
+            }), 401
+        
+        return jsonify({
+            'success': True,
+            'message': 'Token refreshed',
+            'data': {
+                'token': token,
+                'refresh_token': new_refresh_token
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Internal error: {str(e)}'
+        }), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@authentication_required
+def logout():
+    """Revoke the current access token and, if provided, the refresh token"""
+    try:
+        revoke_token(request.token_payload)
+        
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get('refresh_token')
+        if refresh_token:
+            try:
+                revoke_token(decode_token(refresh_token, REFRESH_TOKEN))
+            except jwt.InvalidTokenError:
+                # Already expired, revoked or invalid: nothing left to revoke
+                pass
+        
+        return jsonify({
+            'success': True,
+            'message': 'Logout successful'
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Internal error: {str(e)}'
+        }), 500
+
 # Google OAuth routes
 @auth_bp.route('/google/login')
 def google_login():
     """Start Google login process"""
     try:
+        # requests-oauthlib is only needed for the OAuth flow
+        from requests_oauthlib import OAuth2Session
+        
         # Check if Google credentials are configured
         if not current_app.config.get('GOOGLE_CLIENT_ID') or not current_app.config.get('GOOGLE_CLIENT_SECRET'):
             return jsonify({
@@ -378,6 +476,8 @@ def google_login():
 def google_callback():
     """Google OAuth callback"""
     try:
+        from requests_oauthlib import OAuth2Session
+        
         # Check for error in response
         if 'error' in request.args:
             error_msg = request.args.get('error_description', 'Unknown error')
@@ -427,6 +527,7 @@ def google_callback():
                 # Associate Google account with existing user
                 email_user.google_id = google_id
                 if email_user.save():
+                    audit('google_link', email_user.uid, google_id=google_id)
                     user = email_user
                 else:
                     return redirect('/?error=Error associating Google account')
@@ -441,11 +542,21 @@ def google_callback():
                     has_password=False
                 )
                 
-                if not user.save():
+                try:
+                    created = user.create()
+                except EmailInUseError:
+                    # Another registration reserved the email meanwhile; retrying links the account
+                    return redirect('/?error=Email is already in use, please try again')
+                if not created:
                     return redirect('/?error=Error creating user')
+                audit('register', user_id, method='google')
+        
+        # Count the login (buffered, written in batches)
+        login_stats.record_login(user.uid)
+        audit('login', user.uid, method='google')
         
         # Generate JWT token
-        jwt_token = generate_jwt_token(user.uid)
+        jwt_token = generate_jwt_token(user)
         
         # Redirect with token (in production, use more secure method)
         return redirect(f'/?token={jwt_token}&user={user.uid}')
@@ -489,6 +600,7 @@ def google_user_info():
                 # Associate Google account with existing user
                 email_user.google_id = google_id
                 if email_user.save():
+                    audit('google_link', email_user.uid, google_id=google_id)
                     user = email_user
                 else:
                     return jsonify({
@@ -506,27 +618,34 @@ def google_user_info():
                     has_password=False
                 )
                 
-                if not user.save():
+                try:
+                    created = user.create()
+                except EmailInUseError:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Email is already in use, please try again'
+                    }), 409
+                if not created:
                     return jsonify({
                         'success': False,
                         'message': 'Error creating user'
                     }), 500
+                audit('register', user_id, method='google')
+        
+        # Count the login (buffered, written in batches)
+        login_stats.record_login(user.uid)
+        audit('login', user.uid, method='google')
         
         # Generate JWT token
-        jwt_token = generate_jwt_token(user.uid)
+        jwt_token = generate_jwt_token(user)
         
         return jsonify({
             'success': True,
             'message': 'Google login successful',
             'data': {
-                'user': {
-                    'uid': user.uid,
-                    'email': user.email,
-                    'name': user.name,
-                    'has_password': user.has_password,
-                    'google_id': True
-                },
-                'token': jwt_token
+                'user': public_user(user),
+                'token': jwt_token,
+                'refresh_token': generate_refresh_token(user.uid)
             }
         }), 200
         
@@ -0,0 +1,101 @@
+"""
+Comandos de linha de comando (flask <comando>)
+
+Uso: flask --app run <comando>
+"""
+
+import click
+from flask import current_app
+
+def register_commands(app):
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(recount_user_stats_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(export_users_command)
+    app.cli.add_command(set_roles_command)
+
+@click.command('build-assets')
+def build_assets_command():
+    """Gerar os assets estáticos com fingerprint e pré-comprimidos"""
+    from app.static_assets import build_assets
+    manifest = build_assets(current_app.static_folder)
+    for name, fingerprinted in manifest['files'].items():
+        click.echo(f"{name} -> {fingerprinted}")
+
+@click.command('recount-user-stats')
+def recount_user_stats_command():
+    """Recalcular os contadores agregados varrendo a coleção users"""
+    from app.models import User
+    from app.user_stats import recount
+    values = recount(User.all_users())
+    for field, value in sorted(values.items()):
+        click.echo(f"{field}: {value}")
+
+@click.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Formato do arquivo (padrão: pela extensão)')
+@click.option('--batch-size', default=250, show_default=True, help='Usuários por WriteBatch (máximo 250: cada um grava também a reserva do e-mail)')
+@click.option('--workers', type=int, help='Processos para os hashes bcrypt (padrão: número de CPUs)')
+@click.option('--rounds', default=12, show_default=True, help='Custo do bcrypt para senhas em texto')
+@click.option('--checkpoint', 'checkpoint_path', help='Arquivo de checkpoint (padrão: PATH.checkpoint.json)')
+@click.option('--resume', is_flag=True, help='Continuar a partir do checkpoint')
+def import_users_command(path, fmt, batch_size, workers, rounds, checkpoint_path, resume):
+    """Importar usuários de um CSV ou NDJSON (email, name, password ou password_hash, google_id, created_at)"""
+    from app.user_import import Checkpoint, import_users, read_records
+
+    def report(state, rate):
+        click.echo(f"{state['position']} registros: {state['imported']} importados, "
+                   f"{state['skipped']} já existentes, {state['invalid']} inválidos ({rate:.1f} registros/s)")
+
+    state = import_users(
+        read_records(path, fmt),
+        batch_size=batch_size,
+        workers=workers,
+        rounds=rounds,
+        checkpoint=Checkpoint(checkpoint_path or f'{path}.checkpoint.json'),
+        resume=resume,
+        report=report
+    )
+    click.echo(f"Concluído: {state['imported']} usuários importados")
+
+@click.command('export-users')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--fields', help='Campos separados por vírgula (padrão: todos menos password_hash)')
+@click.option('--redact', help='Campos substituídos por um hash estável (ex.: email,name)')
+@click.option('--gzip', 'compress', is_flag=True, help='Comprimir a saída com gzip')
+@click.option('--page-size', default=500, show_default=True, help='Usuários por leitura no Firestore')
+def export_users_command(output, fmt, fields, redact, compress, page_size):
+    """Exportar a coleção users em streaming para OUTPUT (padrão: saída padrão)"""
+    from app.user_export import export_users, parse_fields
+
+    try:
+        fields = parse_fields(fields)
+        redact = parse_fields(redact, default=())
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    def progress(count, rate):
+        click.echo(f"{count} usuários exportados ({rate:.1f} usuários/s)", err=True)
+
+    with click.open_file(output, 'wb') as f:
+        for chunk in export_users(fmt, fields, redact, compress, page_size, progress):
+            f.write(chunk)
+
+@click.command('set-roles')
+@click.argument('email')
+@click.argument('roles', nargs=-1)
+def set_roles_command(email, roles):
+    """Definir os papéis de um usuário (ex.: flask set-roles ana@exemplo.com admin)"""
+    from app.models import User
+    from app.permissions import ROLES, change_roles
+    user = User.find_by_email(email.strip().lower())
+    if not user:
+        raise click.ClickException(f"Usuário não encontrado: {email}")
+    try:
+        changed = change_roles(user, list(roles) or ['user'])
+    except ValueError as e:
+        raise click.BadParameter(f"{e} (disponíveis: {', '.join(ROLES)})")
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{user.email}: {', '.join(user.roles)}" + ('' if changed else ' (sem alteração)'))
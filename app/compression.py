@@ -0,0 +1,236 @@
+"""
+Middleware WSGI de compressão de respostas (gzip/brotli)
+
+Comprime respostas cujo Content-Type está na allowlist e cujo corpo atinge
+o tamanho mínimo. O corpo é comprimido chunk a chunk, então respostas em
+streaming (geradores) não são bufferizadas: só os primeiros bytes, até o
+tamanho mínimo, ficam retidos para decidir se vale comprimir, e a saída
+comprimida é liberada a cada `flush_size` bytes de entrada.
+"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    'application/json', 'application/x-ndjson', 'text/csv',
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript'
+)
+
+class _GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # Sync flush: o que já foi comprimido sai imediatamente para o cliente
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class _BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+def _accepted(accept_encoding):
+    """Codificações suportadas aceitas (q > 0) a partir do cabeçalho Accept-Encoding.
+
+    `*` vale para as codificações que não aparecem pelo nome, então
+    `*;q=0` recusa todas e `gzip;q=0, *` aceita só brotli.
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name.strip()] = q
+    wildcard = weights.get('*', 0.0)
+    return {name for name in ('br', 'gzip') if weights.get(name, wildcard) > 0}
+
+def _chain(buffered, chunks):
+    yield from buffered
+    yield from chunks
+
+def _with_written(written, app_iter):
+    """Dados passados ao write() (apps WSGI legados) saem antes dos chunks do iterável"""
+    while written:
+        yield written.pop(0)
+    for chunk in app_iter:
+        while written:
+            yield written.pop(0)
+        yield chunk
+    while written:
+        yield written.pop(0)
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=1024, level=6, brotli_quality=4, mimetypes=DEFAULT_MIMETYPES,
+                 flush_size=16384):
+        self.app = app
+        self.min_size = min_size
+        self.flush_size = flush_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.mimetypes = frozenset(mimetypes)
+
+    def _encoder(self, environ):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        accepted = _accepted(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            return lambda: _BrotliEncoder(self.brotli_quality)
+        if 'gzip' in accepted:
+            return lambda: _GzipEncoder(self.level)
+        return None
+
+    def _compressible(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        values = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in values or 'no-transform' in values.get('cache-control', ''):
+            return False
+        mimetype = values.get('content-type', '').split(';', 1)[0].strip().lower()
+        if mimetype not in self.mimetypes:
+            return False
+        length = values.get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        make_encoder = self._encoder(environ)
+        if make_encoder is None:
+            # Sem compressão para este cliente, mas a resposta depende do
+            # Accept-Encoding: caches não podem servi-la a quem aceita gzip/br
+            def vary_start_response(status, headers, exc_info=None):
+                if self._compressible(status, headers):
+                    headers = self._with_vary(headers)
+                return start_response(status, headers, exc_info)
+
+            return self.app(environ, vary_start_response)
+
+        state = {}
+        written = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            state['status'] = status
+            state['headers'] = headers
+            state['exc_info'] = exc_info
+            # O write() do WSGI: os dados entram no corpo e são comprimidos junto
+            return written.append
+
+        app_iter = self.app(environ, capture_start_response)
+        return self._respond(app_iter, state, written, make_encoder, start_response)
+
+    def _respond(self, app_iter, state, written, make_encoder, start_response):
+        try:
+            chunks = _with_written(written, app_iter)
+            buffered = []
+            size = 0
+            exhausted = False
+
+            # start_response pode ser chamado só na primeira iteração
+            while 'status' not in state:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if chunk:
+                    buffered.append(chunk)
+                    size += len(chunk)
+
+            if 'status' not in state:
+                raise RuntimeError("A aplicação WSGI terminou sem chamar start_response")
+            status, headers = state['status'], state['headers']
+            eligible = compress = self._compressible(status, headers)
+
+            # Reter chunks até o tamanho mínimo para decidir se vale comprimir
+            while compress and not exhausted and size < self.min_size:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if chunk:
+                    buffered.append(chunk)
+                    size += len(chunk)
+            if exhausted and size < self.min_size:
+                compress = False
+
+            if not compress:
+                if eligible:
+                    headers = self._with_vary(headers)
+                start_response(status, headers, state.get('exc_info'))
+                yield from buffered
+                if not exhausted:
+                    yield from chunks
+                return
+
+            encoder = make_encoder()
+            new_headers = [(name, value) for name, value in headers
+                           if name.lower() not in ('content-length', 'vary', 'etag')]
+            new_headers.append(('Content-Encoding', encoder.name))
+            new_headers.append(('Vary', self._vary(headers)))
+            # O corpo muda, então um ETag forte deixa de ser válido
+            etag = next((value for name, value in headers if name.lower() == 'etag'), None)
+            if etag:
+                new_headers.append(('ETag', etag if etag.startswith('W/') else 'W/' + etag))
+            start_response(status, new_headers, state.get('exc_info'))
+
+            # Agrupar chunks pequenos (ex.: linhas NDJSON) em blocos de até
+            # flush_size antes de comprimir; a saída de cada bloco é liberada
+            pending = []
+            pending_size = 0
+            for chunk in buffered if exhausted else _chain(buffered, chunks):
+                if not chunk:
+                    continue
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= self.flush_size:
+                    yield encoder.compress(b''.join(pending)) + encoder.flush()
+                    pending = []
+                    pending_size = 0
+            if pending:
+                yield encoder.compress(b''.join(pending))
+            yield encoder.finish()
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+
+    @classmethod
+    def _with_vary(cls, headers):
+        """Cabeçalhos com Accept-Encoding incluído no Vary"""
+        return [(name, value) for name, value in headers if name.lower() != 'vary'] + [('Vary', cls._vary(headers))]
+
+    @staticmethod
+    def _vary(headers):
+        values = [value for name, value in headers if name.lower() == 'vary']
+        fields = [field.strip() for value in values for field in value.split(',') if field.strip()]
+        if 'accept-encoding' not in (field.lower() for field in fields):
+            fields.append('Accept-Encoding')
+        return ', '.join(fields)
@@ -3,10 +3,103 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Servidor de desenvolvimento (FLASK_ENV=development ou FLASK_DEBUG)
+_DEVELOPMENT = (os.environ.get('FLASK_ENV') == 'development'
+                or os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes'))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
-    JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hora
+    JWT_ACCESS_TOKEN_EXPIRES = int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 900))  # 15 minutos
+    JWT_REFRESH_TOKEN_EXPIRES = int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRES', 30 * 24 * 3600))  # 30 dias
+    
+    # Revogação de tokens: 'firestore' (compartilhada entre workers), 'memory'
+    # ou 'modulo:Classe'; cada worker sincroniza a cada REVOCATION_SYNC_INTERVAL s
+    REVOCATION_BACKEND = os.environ.get('REVOCATION_BACKEND', 'firestore')
+    REVOCATION_SYNC_INTERVAL = float(os.environ.get('REVOCATION_SYNC_INTERVAL', 5.0))
+    REVOCATION_CAPACITY = int(os.environ.get('REVOCATION_CAPACITY', 100000))
+    
+    # Segundos durante os quais o front-end pode confiar num token validado
+    TOKEN_REVALIDATE_AFTER = int(os.environ.get('TOKEN_REVALIDATE_AFTER', 300))
+    
+    # JSON: 'orjson' (se instalado) ou 'default' (json da stdlib)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
+    USER_VIEW_CACHE_SIZE = int(os.environ.get('USER_VIEW_CACHE_SIZE', 10000))
+    
+    # Cache de usuários por UID (segundos; 0 desativa). Dentro do TTL um
+    # worker pode não ver alterações feitas por outro worker.
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 0))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    
+    # Estatísticas de login: gravadas em lote a cada N segundos ou N logins
+    LOGIN_STATS_FLUSH_INTERVAL = float(os.environ.get('LOGIN_STATS_FLUSH_INTERVAL', 5.0))
+    LOGIN_STATS_FLUSH_EVENTS = int(os.environ.get('LOGIN_STATS_FLUSH_EVENTS', 500))
+    
+    # Shards dos contadores agregados de usuários (stats_shards)
+    STATS_COUNTER_SHARDS = int(os.environ.get('STATS_COUNTER_SHARDS', 10))
+    
+    # Usuários ativos (HyperLogLog): backend 'firestore' (combina os workers),
+    # 'memory' ou 'modulo:Classe'; precisão p usa 2^p bytes por bucket
+    ACTIVE_USERS_BACKEND = os.environ.get('ACTIVE_USERS_BACKEND', 'firestore')
+    ACTIVE_USERS_SYNC_INTERVAL = float(os.environ.get('ACTIVE_USERS_SYNC_INTERVAL', 10.0))
+    ACTIVE_USERS_PRECISION = int(os.environ.get('ACTIVE_USERS_PRECISION', 12))
+    
+    # Auditoria de autenticação: 'firestore' (coleção audit_events) ou 'jsonl'
+    # (arquivos em AUDIT_LOG_DIR); política com a fila cheia: drop, block ou sample
+    AUDIT_SINK = os.environ.get('AUDIT_SINK', 'firestore')
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_BACKPRESSURE = os.environ.get('AUDIT_BACKPRESSURE', 'drop')
+    AUDIT_SAMPLE_RATE = float(os.environ.get('AUDIT_SAMPLE_RATE', 0.1))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+    AUDIT_LOG_DIR = os.environ.get('AUDIT_LOG_DIR', 'audit_logs')
+    AUDIT_LOG_MAX_BYTES = int(os.environ.get('AUDIT_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    AUDIT_LOG_BACKUPS = int(os.environ.get('AUDIT_LOG_BACKUPS', 5))
+    
+    # Logs JSON via fila (QueueHandler/QueueListener); avisos e erros repetidos
+    # são limitados a LOG_RATE_LIMIT por janela de LOG_RATE_WINDOW s e amostrados
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_RATE_LIMIT = int(os.environ.get('LOG_RATE_LIMIT', 20))
+    LOG_RATE_WINDOW = float(os.environ.get('LOG_RATE_WINDOW', 10.0))
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+    # Uma linha de acesso por requisição (status e duração)
+    LOG_REQUESTS = os.environ.get('LOG_REQUESTS', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Listagem administrativa de usuários (/api/admin/users): tamanho de página padrão e máximo
+    ADMIN_USERS_PAGE_SIZE = int(os.environ.get('ADMIN_USERS_PAGE_SIZE', 100))
+    ADMIN_USERS_MAX_PAGE_SIZE = int(os.environ.get('ADMIN_USERS_MAX_PAGE_SIZE', 1000))
+    
+    # E-mails (separados por vírgula) que recebem o papel 'admin' ao serem
+    # criados ou carregados sem papéis; os demais papéis via `flask set-roles`
+    ADMIN_EMAILS = frozenset(
+        email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()
+    )
+    
+    # Cadastro idempotente: TTL dos resultados por chave (segundos), limite de
+    # chaves por processo e espera máxima por uma execução em andamento
+    IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 300))
+    IDEMPOTENCY_MAX_KEYS = int(os.environ.get('IDEMPOTENCY_MAX_KEYS', 10000))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 30))
+    
+    # Micro-cache das respostas anônimas de /api/public e /api/mixed (segundos; 0 desativa)
+    MICROCACHE_TTL = float(os.environ.get('MICROCACHE_TTL', 1.0))
+    
+    # Gerar assets estáticos com fingerprint/pré-comprimidos no create_app
+    # (padrão só em desenvolvimento; em produção o build é um passo de
+    # deploy, `flask build-assets`, e o create_app só lê o manifesto)
+    STATIC_ASSETS_BUILD = os.environ.get(
+        'STATIC_ASSETS_BUILD', 'true' if _DEVELOPMENT else 'false'
+    ).lower() in ('1', 'true', 'yes')
+    
+    # Compressão de respostas (gzip/brotli)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip 1-9
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))  # brotli 0-11
+    COMPRESS_MIMETYPES = [m.strip() for m in os.environ.get(
+        'COMPRESS_MIMETYPES',
+        'application/json,application/x-ndjson,text/csv,text/html,text/plain,text/css,text/javascript,application/javascript'
+    ).split(',') if m.strip()]
     
     # Google OAuth
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
@@ -16,3 +109,24 @@ class Config:
     # Firebase
     FIREBASE_CREDENTIALS_PATH = os.environ.get('FIREBASE_CREDENTIALS_PATH') or 'firebase-credentials.json'
     FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID')
+    # Inicializar o cliente no create_app em vez de no primeiro uso
+    FIREBASE_EAGER_INIT = os.environ.get('FIREBASE_EAGER_INIT', '').lower() in ('1', 'true', 'yes')
+    
+    # Cliente Firestore: canais gRPC, deadline por chamada e retry/backoff
+    FIRESTORE_EMULATOR_HOST = os.environ.get('FIRESTORE_EMULATOR_HOST')
+    FIRESTORE_CHANNEL_POOL_SIZE = int(os.environ.get('FIRESTORE_CHANNEL_POOL_SIZE', 1))
+    FIRESTORE_KEEPALIVE_MS = int(os.environ.get('FIRESTORE_KEEPALIVE_MS', 30000))
+    FIRESTORE_KEEPALIVE_TIMEOUT_MS = int(os.environ.get('FIRESTORE_KEEPALIVE_TIMEOUT_MS', 10000))
+    FIRESTORE_CALL_TIMEOUT = float(os.environ.get('FIRESTORE_CALL_TIMEOUT', 5.0))  # segundos
+    FIRESTORE_RETRY_ATTEMPTS = int(os.environ.get('FIRESTORE_RETRY_ATTEMPTS', 3))
+    FIRESTORE_RETRY_INITIAL = float(os.environ.get('FIRESTORE_RETRY_INITIAL', 0.1))
+    FIRESTORE_RETRY_MAXIMUM = float(os.environ.get('FIRESTORE_RETRY_MAXIMUM', 2.0))
+    FIRESTORE_RETRY_MULTIPLIER = float(os.environ.get('FIRESTORE_RETRY_MULTIPLIER', 2.0))
+
+def uses_simulator():
+    """True quando get_db() usará o simulador local (sem emulador nem credenciais).
+
+    O estado do simulador é por processo: nada gravado em um worker do
+    Gunicorn é visto pelos demais.
+    """
+    return not Config.FIRESTORE_EMULATOR_HOST and not os.path.exists(Config.FIREBASE_CREDENTIALS_PATH)
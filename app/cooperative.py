@@ -0,0 +1,26 @@
+"""
+Execução cooperativa (workers gevent do Gunicorn)
+
+Com GUNICORN_WORKER_CLASS=gevent cada requisição roda em uma greenlet e
+toda espera de I/O (gRPC do Firestore, HTTP dos endpoints OAuth do Google,
+latência do simulador) cede o processo para as demais; um único worker
+mantém milhares de requisições em andamento. O custo é que trabalho de CPU
+em C segura o loop inteiro: o bcrypt (~0,2s por hash) é desviado para o
+pool de threads nativas do hub, já que libera o GIL.
+"""
+
+import sys
+
+def cooperative():
+    """True quando o processo roda com o monkey patching do gevent"""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+def run_blocking(func, *args):
+    """Executar `func(*args)` sem bloquear as outras greenlets do worker"""
+    if cooperative():
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args)
+    return func(*args)
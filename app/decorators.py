@@ -1,7 +1,10 @@
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, make_response
 import jwt
 from app.models import User
+from app.tokens import decode_token, RevokedTokenError
+from app.active_users import active_users
+from app.permissions import Permission
 
 def authentication_required(f):
     """Decorator to protect routes that require authentication"""
@@ -28,12 +31,8 @@ def authentication_required(f):
             }), 401
         
         try:
-            # Decode JWT token
-            data = jwt.decode(
-                token, 
-                current_app.config['JWT_SECRET_KEY'], 
-                algorithms=['HS256']
-            )
+            # Decode JWT token (checks type and revocation)
+            data = decode_token(token)
             
             # Find user in database
             current_user = User.find_by_uid(data['user_id'])
@@ -45,12 +44,21 @@ def authentication_required(f):
             
             # Add current user to request context
             request.current_user = current_user
+            request.token_payload = data
+            
+            # Approximate distinct active users (in-memory HyperLogLog)
+            active_users.record(current_user.uid)
             
         except jwt.ExpiredSignatureError:
             return jsonify({
                 'success': False,
                 'message': 'Token expired'
             }), 401
+        except RevokedTokenError:
+            return jsonify({
+                'success': False,
+                'message': 'Token revoked'
+            }), 401
         except jwt.InvalidTokenError:
             return jsonify({
                 'success': False,
@@ -80,16 +88,13 @@ def optional_authentication(f):
                 token = auth_header.split(" ")[1]
                 
                 # Try to decode token
-                data = jwt.decode(
-                    token, 
-                    current_app.config['JWT_SECRET_KEY'], 
-                    algorithms=['HS256']
-                )
+                data = decode_token(token)
                 
                 # Find user in database
                 current_user = User.find_by_uid(data['user_id'])
                 if current_user:
                     request.current_user = current_user
+                    request.token_payload = data
                     
             except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, IndexError):
                 # Invalid or expired token, but continue without authentication
@@ -98,3 +103,62 @@ def optional_authentication(f):
         return f(*args, **kwargs)
     
     return decorated_function
+
+def permission_required(permission):
+    """Decorator that requires a permission bit in the access token.
+
+    Must be applied after authentication_required. The check is a bit test
+    on the token's `perm` claim (compiled from the user's roles when the
+    token was issued), so it needs no database access.
+    """
+    message = f'Access denied. {Permission(permission).name} permission required.'
+    
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not request.token_payload.get('perm', 0) & permission:
+                return jsonify({
+                    'success': False,
+                    'message': message
+                }), 403
+            
+            return f(*args, **kwargs)
+        
+        return decorated_function
+    
+    return decorator
+
+def user_etag(tag, user, extra=None):
+    """ETag value for a user-derived representation"""
+    etag = f"{tag}-{user.uid}-{user.version}"
+    return f"{etag}-{extra(user)}" if extra else etag
+
+def conditional_user_response(tag, weak=False, extra=None):
+    """Decorator that answers If-None-Match with 304 based on the user version.
+
+    Must be applied after authentication_required. The ETag comes from the
+    per-user version counter bumped by User.save, so a matching request
+    returns 304 without building the response body. `extra(user)` adds
+    values that change without a new version (e.g. the login count). Use
+    weak=True when the body has fields that are not covered by either.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = user_etag(tag, request.current_user, extra)
+            
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag, weak=weak)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Authorization')
+            return response
+        
+        return decorated_function
+    
+    return decorator
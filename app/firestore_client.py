@@ -0,0 +1,208 @@
+"""
+Construção e políticas de chamada do cliente Firestore
+
+Define o cliente real com opções de canal gRPC configuráveis, o pool de
+canais, o deadline por chamada e a política de retry/backoff usada pelas
+operações de User. Funciona igualmente com o simulador local.
+"""
+
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ordenação/cursor pelo ID do documento (FieldPath.document_id())
+DOCUMENT_ID = '__name__'
+
+# Erros transitórios do google.api_core que valem uma nova tentativa
+_TRANSIENT_API_ERRORS = (
+    'Aborted', 'DeadlineExceeded', 'InternalServerError',
+    'ResourceExhausted', 'ServiceUnavailable'
+)
+
+# Erros em que a escrita certamente não foi aplicada: os únicos repetidos em
+# escritas não idempotentes (incrementos). Após um DeadlineExceeded, por
+# exemplo, o commit pode ter acontecido e repeti-lo somaria duas vezes
+_UNAPPLIED_API_ERRORS = ('ResourceExhausted', 'ServiceUnavailable')
+
+class FirestoreSettings:
+    """Parâmetros do cliente Firestore lidos de Config"""
+
+    def __init__(self, config=Config):
+        self.pool_size = max(1, int(config.FIRESTORE_CHANNEL_POOL_SIZE))
+        self.keepalive_ms = int(config.FIRESTORE_KEEPALIVE_MS)
+        self.keepalive_timeout_ms = int(config.FIRESTORE_KEEPALIVE_TIMEOUT_MS)
+        self.timeout = float(config.FIRESTORE_CALL_TIMEOUT) if config.FIRESTORE_CALL_TIMEOUT else None
+        self.retry_attempts = max(1, int(config.FIRESTORE_RETRY_ATTEMPTS))
+        self.retry_initial = float(config.FIRESTORE_RETRY_INITIAL)
+        self.retry_maximum = float(config.FIRESTORE_RETRY_MAXIMUM)
+        self.retry_multiplier = float(config.FIRESTORE_RETRY_MULTIPLIER)
+
+    def channel_options(self) -> List[Tuple[str, Any]]:
+        """Opções do canal gRPC (keepalive e tamanho de mensagem)"""
+        return [
+            ('grpc.keepalive_time_ms', self.keepalive_ms),
+            ('grpc.keepalive_timeout_ms', self.keepalive_timeout_ms),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.max_pings_without_data', 0),
+            ('grpc.max_send_message_length', -1),
+            ('grpc.max_receive_message_length', -1),
+        ]
+
+_settings = None
+
+def get_settings() -> FirestoreSettings:
+    global _settings
+    if _settings is None:
+        _settings = FirestoreSettings()
+    return _settings
+
+def is_transient_error(error: Exception, idempotent: bool = True) -> bool:
+    """Verificar se vale repetir a operação (Firestore real ou simulador).
+
+    Com `idempotent=False` só contam os erros em que a escrita certamente
+    não foi aplicada.
+    """
+    from app.firestore_simulator import MockDeadlineExceeded, MockFirestoreError
+    if isinstance(error, MockFirestoreError):
+        # O simulador falha antes de aplicar, exceto no deadline (ambíguo)
+        return idempotent or not isinstance(error, MockDeadlineExceeded)
+    # Só consultar google.api_core se ele já foi importado pelo cliente real
+    api_exceptions = sys.modules.get('google.api_core.exceptions')
+    if api_exceptions is None:
+        return False
+    names = _TRANSIENT_API_ERRORS if idempotent else _UNAPPLIED_API_ERRORS
+    return isinstance(error, tuple(getattr(api_exceptions, name) for name in names))
+
+def is_ambiguous_error(error: Exception) -> bool:
+    """Erro transitório após o qual a escrita pode ou não ter sido aplicada"""
+    return is_transient_error(error) and not is_transient_error(error, idempotent=False)
+
+def increment(db, amount=1):
+    """Incremento atômico (firestore.Increment) para o cliente em uso, real ou simulado"""
+    from app.firestore_simulator import Increment, MockFirestoreClient
+    if isinstance(db, MockFirestoreClient):
+        return Increment(amount)
+    from google.cloud.firestore import Increment
+    return Increment(amount)
+
+def is_already_exists(error: Exception) -> bool:
+    """Verificar se o erro indica documento já existente (create())"""
+    from app.firestore_simulator import MockAlreadyExists
+    if isinstance(error, MockAlreadyExists):
+        return True
+    api_exceptions = sys.modules.get('google.api_core.exceptions')
+    return api_exceptions is not None and isinstance(error, api_exceptions.Conflict)
+
+class RetryPolicy:
+    """Backoff exponencial com jitter total para erros transitórios"""
+
+    def __init__(self, attempts: int = 3, initial: float = 0.1, maximum: float = 2.0,
+                 multiplier: float = 2.0, sleep: Callable[[float], None] = time.sleep):
+        self.attempts = attempts
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self._sleep = sleep
+
+    @classmethod
+    def from_settings(cls, settings: FirestoreSettings) -> 'RetryPolicy':
+        return cls(settings.retry_attempts, settings.retry_initial,
+                   settings.retry_maximum, settings.retry_multiplier)
+
+    def delays(self):
+        delay = self.initial
+        for _ in range(self.attempts - 1):
+            yield random.uniform(0, min(delay, self.maximum))
+            delay *= self.multiplier
+
+    def call(self, func: Callable[[], Any], idempotent: bool = True) -> Any:
+        for delay in self.delays():
+            try:
+                return func()
+            except Exception as e:
+                if not is_transient_error(e, idempotent):
+                    raise
+            self._sleep(delay)
+        return func()
+
+def call_firestore(func: Callable[..., Any], *args, policy: Optional[RetryPolicy] = None,
+                   idempotent: bool = True, **kwargs) -> Any:
+    """Executar uma operação do Firestore com deadline e retry configurados.
+
+    `func` recebe `timeout` e `retry=None` (o retry da biblioteca é
+    desativado para que a política seja uma só, inclusive no simulador).
+    `policy` substitui a política de Config (ex.: com `sleep` falso).
+    Escritas com incrementos passam `idempotent=False`: só são repetidas
+    quando o erro garante que nada foi aplicado.
+    """
+    settings = get_settings()
+    kwargs.setdefault('timeout', settings.timeout)
+    kwargs.setdefault('retry', None)
+    policy = policy or RetryPolicy.from_settings(settings)
+    return policy.call(lambda: func(*args, **kwargs), idempotent)
+
+def create_tuned_client(project: str, credentials, settings: Optional[FirestoreSettings] = None):
+    """Criar um google.cloud.firestore.Client com as opções de canal configuradas.
+
+    As opções entram pelo `create_channel` do transporte gRPC (API pública
+    do GAPIC); do cliente só se usa `_firestore_api_helper`, que recebe a
+    classe do transporte. Testado com google-cloud-firestore 2.11.1 e 2.34.1;
+    se o helper não existir, usa o cliente padrão com um aviso. Com o
+    emulador o canal é o inseguro padrão (sem as opções de keepalive).
+    """
+    from google.cloud import firestore as gcloud_firestore
+    from google.cloud.firestore_v1.services.firestore import client as firestore_api_client
+    from google.cloud.firestore_v1.services.firestore.transports import grpc as firestore_grpc_transport
+
+    settings = settings or get_settings()
+    if not hasattr(gcloud_firestore.Client, '_firestore_api_helper'):
+        logger.warning("Versão do google-cloud-firestore sem _firestore_api_helper; "
+                       "usando opções de canal padrão")
+        return gcloud_firestore.Client(project=project, credentials=credentials)
+
+    class TunedGrpcTransport(firestore_grpc_transport.FirestoreGrpcTransport):
+        @classmethod
+        def create_channel(cls, host, credentials=None, **kwargs):
+            # Opções configuradas têm precedência sobre as da biblioteca
+            options = dict(kwargs.pop('options', None) or ())
+            options.update(settings.channel_options())
+            return super().create_channel(host, credentials=credentials, options=list(options.items()), **kwargs)
+
+    class TunedFirestoreClient(gcloud_firestore.Client):
+        @property
+        def _firestore_api(self):
+            return self._firestore_api_helper(
+                TunedGrpcTransport, firestore_api_client.FirestoreClient, firestore_api_client
+            )
+
+    return TunedFirestoreClient(project=project, credentials=credentials)
+
+class FirestoreClientPool:
+    """Distribuir chamadas em round-robin entre N clientes (um canal gRPC cada)"""
+
+    def __init__(self, clients):
+        self.clients = list(clients)
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            client = self.clients[self._index]
+            self._index = (self._index + 1) % len(self.clients)
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self._next(), name)
+
+def create_client_pool(project: str, credentials, settings: Optional[FirestoreSettings] = None):
+    """Criar o cliente (ou pool de clientes) conforme FIRESTORE_CHANNEL_POOL_SIZE"""
+    settings = settings or get_settings()
+    clients = [create_tuned_client(project, credentials, settings) for _ in range(settings.pool_size)]
+    return clients[0] if len(clients) == 1 else FirestoreClientPool(clients)
@@ -4,9 +4,170 @@ Este módulo simula as operações básicas do Firestore quando não há conexã
 """
 
 import json
+import logging
 import os
+import random
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
+
+logger = logging.getLogger(__name__)
+
+class MockFirestoreError(Exception):
+    """Erro simulado do Firestore"""
+
+class MockServiceUnavailable(MockFirestoreError):
+    """Falha transitória simulada (equivalente a UNAVAILABLE)"""
+
+class MockResourceExhausted(MockFirestoreError):
+    """Limite de operações excedido (equivalente a RESOURCE_EXHAUSTED)"""
+
+class MockDeadlineExceeded(MockFirestoreError):
+    """Operação excedeu o timeout da chamada (equivalente a DEADLINE_EXCEEDED)"""
+
+class MockAlreadyExists(Exception):
+    """create() em um documento que já existe (não é transitório)"""
+
+class MockNotFound(Exception):
+    """update() em um documento que não existe (não é transitório)"""
+
+class FaultProfile:
+    """Latência, jitter, erros e throttling simulados por tipo de operação.
+
+    As operações são 'get' (leitura de documento), 'set' (escrita) e
+    'query' (consultas com where/limit). Cada parâmetro aceita um valor
+    único, aplicado a todas as operações, ou um dicionário por operação.
+    """
+
+    OPERATIONS = ('get', 'set', 'query')
+    DISTRIBUTIONS = ('constant', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, latency_ms: Union[float, Dict[str, float]] = 0.0,
+                 jitter_ms: Union[float, Dict[str, float]] = 0.0,
+                 distribution: str = 'constant',
+                 error_rate: Union[float, Dict[str, float]] = 0.0,
+                 max_ops_per_sec: Union[float, Dict[str, float], None] = None,
+                 seed: Optional[int] = None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Distribuição inválida: {distribution}")
+        self.latency_ms = self._per_operation(latency_ms)
+        self.jitter_ms = self._per_operation(jitter_ms)
+        self.distribution = distribution
+        self.error_rate = self._per_operation(error_rate)
+        self.max_ops_per_sec = self._per_operation(max_ops_per_sec)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._buckets = {op: (rate, time.monotonic()) for op, rate in self.max_ops_per_sec.items() if rate}
+
+    @classmethod
+    def _per_operation(cls, value) -> Dict[str, Any]:
+        if isinstance(value, dict):
+            unknown = set(value) - set(cls.OPERATIONS)
+            if unknown:
+                raise ValueError(f"Operações desconhecidas: {', '.join(sorted(unknown))}")
+            return {op: value.get(op) for op in cls.OPERATIONS}
+        return {op: value for op in cls.OPERATIONS}
+
+    @staticmethod
+    def _parse_value(raw: Optional[str]):
+        """Interpretar '5' ou 'get:5,set:20,query:10'"""
+        if raw is None or raw == '':
+            return None
+        if ':' not in raw:
+            return float(raw)
+        values = {}
+        for part in raw.split(','):
+            op, _, number = part.partition(':')
+            values[op.strip()] = float(number)
+        return values
+
+    @classmethod
+    def from_env(cls, environ=None) -> Optional['FaultProfile']:
+        """Criar perfil a partir das variáveis FIRESTORE_SIM_*, ou None se nada estiver configurado"""
+        environ = os.environ if environ is None else environ
+        latency = cls._parse_value(environ.get('FIRESTORE_SIM_LATENCY_MS'))
+        jitter = cls._parse_value(environ.get('FIRESTORE_SIM_JITTER_MS'))
+        error_rate = cls._parse_value(environ.get('FIRESTORE_SIM_ERROR_RATE'))
+        max_ops = cls._parse_value(environ.get('FIRESTORE_SIM_MAX_OPS_PER_SEC'))
+        if latency is None and jitter is None and error_rate is None and max_ops is None:
+            return None
+        seed = environ.get('FIRESTORE_SIM_SEED')
+        return cls(
+            latency_ms=latency or 0.0,
+            jitter_ms=jitter or 0.0,
+            distribution=environ.get('FIRESTORE_SIM_LATENCY_DIST', 'constant'),
+            error_rate=error_rate or 0.0,
+            max_ops_per_sec=max_ops,
+            seed=int(seed) if seed else None
+        )
+
+    def sample_latency_ms(self, operation: str) -> float:
+        """Sortear a latência de uma operação segundo a distribuição configurada"""
+        base = self.latency_ms[operation] or 0.0
+        jitter = self.jitter_ms[operation] or 0.0
+        with self._lock:
+            if self.distribution == 'uniform':
+                value = self._random.uniform(base - jitter, base + jitter)
+            elif self.distribution == 'normal':
+                value = self._random.gauss(base, jitter)
+            elif self.distribution == 'lognormal':
+                # Cauda longa: mediana em 'base', 'jitter' controla a dispersão
+                value = base * self._random.lognormvariate(0.0, jitter / base) if base > 0 else 0.0
+            else:
+                value = base + (self._random.uniform(0.0, jitter) if jitter else 0.0)
+        return max(0.0, value)
+
+    def _take_token(self, operation: str) -> bool:
+        """Token bucket por operação com capacidade de um segundo de tráfego"""
+        rate = self.max_ops_per_sec[operation]
+        if not rate:
+            return True
+        with self._lock:
+            tokens, last = self._buckets[operation]
+            now = time.monotonic()
+            tokens = min(rate, tokens + (now - last) * rate)
+            if tokens < 1.0:
+                self._buckets[operation] = (tokens, now)
+                return False
+            self._buckets[operation] = (tokens - 1.0, now)
+            return True
+
+    def before(self, operation: str, timeout: Optional[float] = None):
+        """Aplicar throttling, latência e falhas antes de executar a operação"""
+        if not self._take_token(operation):
+            raise MockResourceExhausted(f"Limite de operações '{operation}' excedido")
+        delay = self.sample_latency_ms(operation)
+        if timeout is not None and delay > timeout * 1000.0:
+            time.sleep(timeout)
+            raise MockDeadlineExceeded(f"Operação '{operation}' excedeu {timeout}s")
+        if delay:
+            time.sleep(delay / 1000.0)
+        error_rate = self.error_rate[operation] or 0.0
+        if error_rate:
+            with self._lock:
+                failed = self._random.random() < error_rate
+            if failed:
+                raise MockServiceUnavailable(f"Falha simulada na operação '{operation}'")
+
+class Increment:
+    """Equivalente a firestore.Increment: soma aplicada atomicamente na escrita"""
+
+    def __init__(self, value):
+        self.value = value
+
+def _apply_write(current: Dict[str, Any], data: Dict[str, Any], merge: bool) -> Dict[str, Any]:
+    """Resultado de um set(); Increment soma ao valor atual (ou parte de 0)"""
+    result = dict(current) if merge else {}
+    for key, value in data.items():
+        if isinstance(value, Increment):
+            base = result.get(key)
+            value = base + value.value if isinstance(base, (int, float)) else value.value
+        result[key] = value
+    return result
+
+# Escritas e gravação do arquivo serializadas entre threads do processo
+_storage_lock = threading.RLock()
 
 class MockDocument:
     def __init__(self, doc_id: str, data: Dict[str, Any]):
@@ -20,12 +181,43 @@ class MockDocument:
     def exists(self) -> bool:
         return bool(self._data)
 
+_COMPARISONS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'in': lambda a, b: a in b,
+}
+
+def _matches(field_value, operator: str, value: Any) -> bool:
+    """Aplicar um filtro do where; campos ausentes só casam com '==' None"""
+    if operator not in _COMPARISONS:
+        raise ValueError(f"Operador não suportado pelo simulador: {operator}")
+    if field_value is None and operator != '==':
+        return False
+    try:
+        return _COMPARISONS[operator](field_value, value)
+    except TypeError:
+        return False
+
+# Campo especial de ordenação pelo ID do documento (FieldPath.document_id())
+DOCUMENT_ID = '__name__'
+
 class MockQuery:
-    def __init__(self, collection_name: str, storage: Dict[str, Any]):
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+    
+    def __init__(self, collection_name: str, storage: Dict[str, Any], faults: Optional[FaultProfile] = None):
         self.collection_name = collection_name
         self.storage = storage
+        self.faults = faults
         self._filters = []
         self._limit = None
+        self._orders = []
+        self._start_after = None
+        self._fields = None
     
     def where(self, field: str, operator: str, value: Any):
         self._filters.append((field, operator, value))
@@ -35,47 +227,124 @@ class MockQuery:
         self._limit = count
         return self
     
-    def stream(self):
+    def order_by(self, field: str, direction: str = ASCENDING):
+        self._orders.append((field, direction))
+        return self
+    
+    def start_after(self, cursor):
+        """Cursor: documento retornado antes ou dicionário {campo: valor} dos campos de ordenação"""
+        self._start_after = cursor
+        return self
+    
+    def select(self, field_paths):
+        """Projeção: os documentos retornados trazem só estes campos"""
+        self._fields = list(field_paths)
+        return self
+    
+    def _sort_key(self, doc_id: str, doc_data: Dict[str, Any]):
+        return tuple(doc_id if field == DOCUMENT_ID else doc_data.get(field) for field, _ in self._orders)
+    
+    def _after_cursor(self, key) -> bool:
+        cursor = self._start_after
+        if isinstance(cursor, MockDocument):
+            cursor_key = self._sort_key(cursor.id, cursor._data)
+        else:
+            cursor_key = tuple(cursor[field] for field, _ in self._orders)
+        for value, cursor_value, (_, direction) in zip(key, cursor_key, self._orders):
+            if value != cursor_value:
+                return value > cursor_value if direction == self.ASCENDING else value < cursor_value
+        return False
+    
+    def stream(self, retry=None, timeout: Optional[float] = None):
+        if self.faults:
+            self.faults.before('query', timeout)
         collection_data = self.storage.get(self.collection_name, {})
-        results = []
+        matched = []
         
         for doc_id, doc_data in collection_data.items():
             # Aplicar filtros
             match = True
             for field, operator, value in self._filters:
-                if operator == '==':
-                    if doc_data.get(field) != value:
-                        match = False
-                        break
-                # Adicionar outros operadores conforme necessário
-            
-            if match:
-                results.append(MockDocument(doc_id, doc_data))
-                
-                # Aplicar limite
-                if self._limit and len(results) >= self._limit:
+                if not _matches(doc_data.get(field), operator, value):
+                    match = False
                     break
+            
+            # Como no Firestore, ordenar por um campo exclui documentos sem ele
+            if match and all(field == DOCUMENT_ID or doc_data.get(field) is not None for field, _ in self._orders):
+                matched.append((doc_id, doc_data))
+        
+        if self._orders:
+            # Ordenação estável aplicada do último critério para o primeiro
+            for position in range(len(self._orders) - 1, -1, -1):
+                field, direction = self._orders[position]
+                matched.sort(key=lambda item: self._sort_key(*item)[position],
+                             reverse=direction == self.DESCENDING)
+            if self._start_after is not None:
+                matched = [item for item in matched if self._after_cursor(self._sort_key(*item))]
+        
+        results = []
+        for doc_id, doc_data in matched:
+            if self._fields is not None:
+                doc_data = {field: doc_data[field] for field in self._fields if field in doc_data}
+            results.append(MockDocument(doc_id, doc_data))
+            
+            # Aplicar limite
+            if self._limit and len(results) >= self._limit:
+                break
         
         return results
 
 class MockDocumentReference:
-    def __init__(self, collection_name: str, doc_id: str, storage: Dict[str, Any]):
+    def __init__(self, collection_name: str, doc_id: str, storage: Dict[str, Any],
+                 faults: Optional[FaultProfile] = None):
         self.collection_name = collection_name
         self.doc_id = doc_id
         self.storage = storage
+        self.faults = faults
     
-    def set(self, data: Dict[str, Any]):
-        if self.collection_name not in self.storage:
-            self.storage[self.collection_name] = {}
+    def set(self, data: Dict[str, Any], merge: bool = False, retry=None, timeout: Optional[float] = None):
+        if self.faults:
+            self.faults.before('set', timeout)
         
+        self._write(data, merge)
+        self._save_to_file()
+    
+    def _write(self, data: Dict[str, Any], merge: bool):
+        """Aplicar a escrita na memória, sem latência nem gravação do arquivo"""
         # Converter datetime para string para serialização
         serializable_data = self._make_serializable(data)
-        self.storage[self.collection_name][self.doc_id] = serializable_data
+        with _storage_lock:
+            collection = self.storage.setdefault(self.collection_name, {})
+            current = collection.get(self.doc_id, {})
+            collection[self.doc_id] = _apply_write(current, serializable_data, merge)
+    
+    def update(self, data: Dict[str, Any], retry=None, timeout: Optional[float] = None):
+        """Alterar só os campos informados; falha se o documento não existir"""
+        if self.faults:
+            self.faults.before('set', timeout)
+        with _storage_lock:
+            current = self.storage.get(self.collection_name, {}).get(self.doc_id)
+            if not current:
+                raise MockNotFound(f"Documento não encontrado: {self.collection_name}/{self.doc_id}")
+            self.storage[self.collection_name][self.doc_id] = _apply_write(current, self._make_serializable(data), True)
         self._save_to_file()
     
-    def get(self):
+    def create(self, data: Dict[str, Any], retry=None, timeout: Optional[float] = None):
+        if self.faults:
+            self.faults.before('set', timeout)
+        with _storage_lock:
+            if self.storage.get(self.collection_name, {}).get(self.doc_id):
+                raise MockAlreadyExists(f"Documento já existe: {self.collection_name}/{self.doc_id}")
+            self.storage.setdefault(self.collection_name, {})[self.doc_id] = self._make_serializable(data)
+        self._save_to_file()
+    
+    def get(self, field_paths=None, retry=None, timeout: Optional[float] = None):
+        if self.faults:
+            self.faults.before('get', timeout)
         collection_data = self.storage.get(self.collection_name, {})
         doc_data = collection_data.get(self.doc_id, {})
+        if field_paths is not None:
+            doc_data = {key: doc_data[key] for key in field_paths if key in doc_data}
         return MockDocument(self.doc_id, doc_data)
     
     def _make_serializable(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -93,27 +362,77 @@ class MockDocumentReference:
     def _save_to_file(self):
         """Salvar dados no arquivo local"""
         try:
-            with open(self.storage['_file_path'], 'w') as f:
+            with _storage_lock, open(self.storage['_file_path'], 'w') as f:
                 # Criar uma cópia dos dados sem a chave especial '_file_path'
                 data_to_save = {k: v for k, v in self.storage.items() if k != '_file_path'}
                 json.dump(data_to_save, f, indent=2)
         except Exception as e:
-            print(f"Erro ao salvar dados locais: {e}")
+            logger.error("Erro ao salvar dados locais: %s", e)
+
+class MockWriteBatch:
+    """Escritas agrupadas aplicadas juntas no commit(), como WriteBatch"""
+
+    def __init__(self, faults: Optional[FaultProfile] = None):
+        self.faults = faults
+        self._writes = []
+    
+    def set(self, reference: MockDocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._writes.append((reference, data, merge))
+        return self
+    
+    def create(self, reference: MockDocumentReference, data: Dict[str, Any]):
+        """Criar o documento; o commit inteiro falha se ele já existir"""
+        self._writes.append((reference, data, None))
+        return self
+    
+    def __len__(self):
+        return len(self._writes)
+    
+    @staticmethod
+    def _exists(reference: MockDocumentReference) -> bool:
+        return bool(reference.storage.get(reference.collection_name, {}).get(reference.doc_id))
+    
+    def commit(self, retry=None, timeout: Optional[float] = None):
+        if self.faults:
+            self.faults.before('set', timeout)
+        if not self._writes:
+            return
+        with _storage_lock:
+            for reference, _, merge in self._writes:
+                if merge is None and self._exists(reference):
+                    raise MockAlreadyExists(f"Documento já existe: {reference.collection_name}/{reference.doc_id}")
+            for reference, data, merge in self._writes:
+                reference._write(data, bool(merge))
+        self._writes[0][0]._save_to_file()
 
 class MockCollection:
-    def __init__(self, collection_name: str, storage: Dict[str, Any]):
+    def __init__(self, collection_name: str, storage: Dict[str, Any], faults: Optional[FaultProfile] = None):
         self.collection_name = collection_name
         self.storage = storage
+        self.faults = faults
     
     def document(self, doc_id: str):
-        return MockDocumentReference(self.collection_name, doc_id, self.storage)
+        return MockDocumentReference(self.collection_name, doc_id, self.storage, self.faults)
     
     def where(self, field: str, operator: str, value: Any):
-        return MockQuery(self.collection_name, self.storage).where(field, operator, value)
+        return MockQuery(self.collection_name, self.storage, self.faults).where(field, operator, value)
+    
+    def limit(self, count: int):
+        return MockQuery(self.collection_name, self.storage, self.faults).limit(count)
+    
+    def order_by(self, field: str, direction: str = MockQuery.ASCENDING):
+        return MockQuery(self.collection_name, self.storage, self.faults).order_by(field, direction)
+    
+    def select(self, field_paths):
+        return MockQuery(self.collection_name, self.storage, self.faults).select(field_paths)
+    
+    def stream(self, retry=None, timeout: Optional[float] = None):
+        return MockQuery(self.collection_name, self.storage, self.faults).stream(retry=retry, timeout=timeout)
 
 class MockFirestoreClient:
-    def __init__(self, data_file: str = 'firestore_local_data.json'):
+    def __init__(self, data_file: str = 'firestore_local_data.json', faults: Optional[FaultProfile] = None):
         self.data_file = data_file
+        self.faults = faults
         self.storage = self._load_from_file()
         self.storage['_file_path'] = data_file
     
@@ -124,19 +443,39 @@ class MockFirestoreClient:
                 with open(self.data_file, 'r') as f:
                     return json.load(f)
             except Exception as e:
-                print(f"Erro ao carregar dados locais: {e}")
+                logger.error("Erro ao carregar dados locais: %s", e)
         
         return {}
     
     def collection(self, collection_name: str):
-        return MockCollection(collection_name, self.storage)
+        return MockCollection(collection_name, self.storage, self.faults)
+    
+    def batch(self):
+        return MockWriteBatch(self.faults)
+    
+    def get_all(self, references, retry=None, timeout: Optional[float] = None):
+        """Ler vários documentos em uma única operação, como Client.get_all"""
+        if self.faults:
+            self.faults.before('get', timeout)
+        for reference in references:
+            collection_data = self.storage.get(reference.collection_name, {})
+            yield MockDocument(reference.doc_id, collection_data.get(reference.doc_id, {}))
 
-# Instância global do simulador
+# Instância global do simulador (uma por processo)
 _mock_client = None
+_mock_client_pid = None
 
 def get_mock_firestore_client():
     """Obter instância do cliente simulado do Firestore"""
-    global _mock_client
-    if _mock_client is None:
-        _mock_client = MockFirestoreClient()
+    global _mock_client, _mock_client_pid
+    # Após um fork o worker recarrega o arquivo em vez de herdar o estado do pai
+    if _mock_client is None or _mock_client_pid != os.getpid():
+        _mock_client = MockFirestoreClient(faults=FaultProfile.from_env())
+        _mock_client_pid = os.getpid()
     return _mock_client
+
+def reset_mock_firestore_client():
+    """Descartar a instância do simulador do processo atual"""
+    global _mock_client, _mock_client_pid
+    _mock_client = None
+    _mock_client_pid = None
@@ -0,0 +1,104 @@
+"""
+Requisições idempotentes com coalescência das execuções em andamento
+
+Cada operação é identificada por uma chave (o header Idempotency-Key ou,
+sem ele, a impressão digital da própria requisição). A primeira requisição
+de uma chave executa a operação; as simultâneas com a mesma chave esperam
+por ela e recebem o mesmo resultado, e as repetidas dentro do TTL recebem o
+resultado guardado sem executar nada de novo (nem o bcrypt). Reusar uma
+chave com outra requisição é um conflito.
+
+O cache é por processo, como o micro-cache; a unicidade entre workers é
+garantida pela reserva atômica do e-mail (User.create).
+"""
+
+import threading
+import time
+
+from app.config import Config
+
+class IdempotencyConflict(Exception):
+    """Chave já usada com uma requisição diferente"""
+
+class _Entry:
+    __slots__ = ('fingerprint', 'done', 'result', 'expires_at')
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.result = None
+        self.expires_at = None
+
+class IdempotencyCache:
+    """Resultados por chave, com TTL, e espera pelas execuções em andamento"""
+
+    def __init__(self, ttl=300, max_size=10000, wait_timeout=30.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, fingerprint, func, cacheable=lambda result: True):
+        """Executar `func()` uma vez por chave; retorna (resultado, repetido).
+
+        Resultados para os quais `cacheable` retorna False (erros
+        transitórios) não ficam guardados: quem esperava por eles executa
+        a operação de novo.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires_at is not None and entry.expires_at < time.monotonic():
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    entry = self._entries[key] = _Entry(fingerprint)
+                    owner = True
+                else:
+                    owner = False
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflict(key)
+            if owner:
+                return self._execute(key, entry, func, cacheable), False
+            if not entry.done.wait(self.wait_timeout):
+                raise TimeoutError(f"Operação em andamento para a chave {key}")
+            if entry.expires_at is not None:
+                return entry.result, True
+
+    def _execute(self, key, entry, func, cacheable):
+        result = None
+        try:
+            result = func()
+            return result
+        finally:
+            with self._lock:
+                if result is not None and cacheable(result):
+                    entry.result = result
+                    entry.expires_at = time.monotonic() + self.ttl
+                    self._evict()
+                else:
+                    self._entries.pop(key, None)
+            entry.done.set()
+
+    def _evict(self):
+        """Descartar expirados e, acima de max_size, os mais antigos (com o lock)"""
+        if len(self._entries) <= self.max_size:
+            return
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items()
+                    if entry.expires_at is not None and entry.expires_at < now]:
+            del self._entries[key]
+        finished = [key for key, entry in self._entries.items() if entry.expires_at is not None]
+        for key in finished[:len(self._entries) - self.max_size]:
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+registration_requests = IdempotencyCache(
+    ttl=Config.IDEMPOTENCY_TTL,
+    max_size=Config.IDEMPOTENCY_MAX_KEYS,
+    wait_timeout=Config.IDEMPOTENCY_WAIT_TIMEOUT
+)
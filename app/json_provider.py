@@ -0,0 +1,46 @@
+"""
+Provedor JSON rápido para o Flask
+
+Usa orjson quando disponível, mantendo a saída compatível com o provedor
+padrão (chaves ordenadas, datas no formato HTTP). Também permite inserir
+fragmentos JSON já serializados (ver app/serializers.py).
+"""
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Provedor JSON baseado em orjson, com suporte a orjson.Fragment"""
+
+    supports_fragments = True
+
+    def _options(self, indent=False):
+        # Datas e dataclasses passam pelo default() para manter o formato do Flask
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+def get_json_provider_class(name):
+    """Escolher o provedor pelo nome configurado em JSON_PROVIDER"""
+    if name == 'orjson' and orjson is not None:
+        return OrjsonProvider
+    return DefaultJSONProvider
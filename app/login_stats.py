@@ -0,0 +1,169 @@
+"""
+Estatísticas de login com escrita agrupada
+
+Cada login incrementa um contador em memória (por processo) em vez de
+gravar no Firestore. Uma thread em segundo plano descarrega os contadores
+a cada `flush_interval` segundos, ou antes disso ao acumular `max_events`
+logins, em WriteBatches com `login_count` como incremento atômico e o
+`last_login` mais recente. O último lote é gravado no encerramento
+(atexit e hook worker_exit do Gunicorn).
+"""
+
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Limite de escritas por WriteBatch no Firestore
+MAX_BATCH_WRITES = 500
+
+class LoginStatsBuffer:
+    """Logins pendentes por UID: uid -> [quantidade, último login]"""
+
+    def __init__(self, flush_interval=5.0, max_events=500, batch_size=MAX_BATCH_WRITES):
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.batch_size = min(batch_size, MAX_BATCH_WRITES)
+        self._pending = {}
+        # Lote sendo gravado: ainda somado em pending() até o commit
+        self._in_flight = {}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker_pid = None
+
+    def record_login(self, uid, when=None):
+        """Registrar um login; não acessa o banco"""
+        when = when or datetime.utcnow()
+        self._ensure_worker()
+        with self._lock:
+            entry = self._pending.get(uid)
+            if entry is None:
+                self._pending[uid] = [1, when]
+            else:
+                entry[0] += 1
+                entry[1] = max(entry[1], when)
+            self._events += 1
+            full = self._events >= self.max_events
+        if full:
+            self._wakeup.set()
+
+    def pending(self, uid):
+        """Logins deste processo ainda não gravados: (quantidade, último login)"""
+        count, last_login = 0, None
+        for entries in (self._in_flight, self._pending):
+            entry = entries.get(uid)
+            if entry:
+                count += entry[0]
+                last_login = entry[1] if last_login is None else max(last_login, entry[1])
+        return count, last_login
+
+    def _ensure_worker(self):
+        """Iniciar a thread de flush uma vez por processo (seguro após fork)"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            # Contagens herdadas por fork pertencem ao processo pai
+            self._pending = {}
+            self._events = 0
+            self._worker_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='login-stats-flush', daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Gravar os contadores pendentes em lotes; retorna quantos usuários foram gravados"""
+        if self._worker_pid != os.getpid():
+            return 0
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._in_flight = pending
+            self._events = 0
+        items = list(pending.items())
+        written = 0
+        try:
+            for start in range(0, len(items), self.batch_size):
+                chunk = items[start:start + self.batch_size]
+                try:
+                    _write_batch(chunk)
+                except Exception as e:
+                    from app.firestore_client import is_ambiguous_error
+                    logger.error("Erro ao gravar estatísticas de login: %s", e)
+                    # Devolver este lote e os seguintes para a próxima tentativa;
+                    # um lote que pode ter sido gravado (ex.: deadline) não volta,
+                    # para não somar os incrementos duas vezes
+                    self._restore(items[start + len(chunk):] if is_ambiguous_error(e) else items[start:])
+                    break
+                written += len(chunk)
+        finally:
+            self._in_flight = {}
+        return written
+
+    def _restore(self, items):
+        with self._lock:
+            self._in_flight = {}
+            for uid, (count, last_login) in items:
+                entry = self._pending.get(uid)
+                if entry is None:
+                    self._pending[uid] = [count, last_login]
+                else:
+                    entry[0] += count
+                    entry[1] = max(entry[1], last_login)
+                self._events += count
+
+def _write_batch(items):
+    from app import get_db
+    from app.firestore_client import call_firestore, increment
+    from app.models import user_cache
+
+    db = get_db()
+    batch = db.batch()
+    users = db.collection('users')
+    for uid, (count, last_login) in items:
+        batch.set(users.document(uid), {
+            'login_count': increment(db, count),
+            'last_login': last_login
+        }, merge=True)
+    call_firestore(batch.commit, idempotent=False)
+    for uid, _ in items:
+        user_cache.invalidate(uid)
+
+def _naive_utc(value):
+    """datetime UTC sem fuso a partir do valor do Firestore (datetime ou ISO no simulador)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def user_login_stats(user):
+    """(login_count, last_login) gravados somados aos pendentes deste processo"""
+    pending_count, pending_last = login_stats.pending(user.uid)
+    last_login = _naive_utc(user.last_login)
+    if pending_last is not None and (last_login is None or pending_last > last_login):
+        last_login = pending_last
+    return (user.login_count or 0) + pending_count, last_login
+
+login_stats = LoginStatsBuffer(Config.LOGIN_STATS_FLUSH_INTERVAL, Config.LOGIN_STATS_FLUSH_EVENTS)
+
+# Encerramento normal do processo (servidor de desenvolvimento, CLI)
+atexit.register(login_stats.flush)
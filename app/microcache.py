@@ -0,0 +1,91 @@
+"""
+Micro-cache de respostas anônimas
+
+Guarda por um TTL curto (ex.: 1s) o corpo de respostas de endpoints quase
+estáticos. Requisições com Authorization não usam o cache; misses
+simultâneos da mesma chave são coalescidos (só uma thread gera a resposta).
+As respostas anônimas levam Cache-Control público para que um CDN ou proxy
+reverso também possa absorver o tráfego.
+"""
+
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+class MicroCache:
+    """Cache por processo de (status, corpo, mimetype) com TTL"""
+
+    def __init__(self):
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry
+
+    def put(self, key, ttl, status, body, mimetype):
+        now = time.monotonic()
+        self._entries[key] = (now + ttl, now, status, body, mimetype)
+
+    def key_lock(self, key):
+        """Lock por chave usado para coalescer misses simultâneos"""
+        lock = self._key_locks.get(key)
+        if lock is None:
+            with self._lock:
+                lock = self._key_locks.setdefault(key, threading.Lock())
+        return lock
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+microcache = MicroCache()
+
+def _cached_response(entry):
+    expires_at, created_at, status, body, mimetype = entry
+    response = current_app.response_class(body, status=status, mimetype=mimetype)
+    response.headers['Age'] = str(int(time.monotonic() - created_at))
+    return response
+
+def _public_headers(response, ttl):
+    response.headers['Cache-Control'] = f'public, max-age={max(1, int(ttl))}'
+    response.vary.add('Authorization')
+    return response
+
+def micro_cached(f):
+    """Cachear a resposta anônima de uma rota GET por MICROCACHE_TTL segundos"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        ttl = current_app.config.get('MICROCACHE_TTL', 0)
+
+        # Requisições autenticadas (ou com qualquer Authorization) não usam o cache
+        if not ttl or request.method != 'GET' or 'Authorization' in request.headers:
+            response = make_response(f(*args, **kwargs))
+            if 'Authorization' in request.headers:
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Authorization')
+            return response
+
+        # A query string não entra na chave: as rotas cacheadas não a usam e
+        # assim o número de chaves fica limitado ao número de rotas
+        key = request.endpoint
+        entry = microcache.get(key)
+        if entry is None:
+            with microcache.key_lock(key):
+                # Outra thread pode ter preenchido a chave enquanto esperávamos
+                entry = microcache.get(key)
+                if entry is None:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    microcache.put(key, ttl, response.status_code, response.get_data(), response.mimetype)
+                    return _public_headers(response, ttl)
+
+        return _public_headers(_cached_response(entry), ttl)
+
+    return decorated_function
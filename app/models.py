@@ -1,10 +1,83 @@
+import hashlib
+import logging
+import threading
+import time
 from datetime import datetime
 from app import get_db
+from app.config import Config
+from app.cooperative import run_blocking
+from app.firestore_client import call_firestore, increment, is_already_exists, DOCUMENT_ID
+from app.user_stats import user_deltas, user_stats
+from app.permissions import initial_roles, permission_mask, validate_roles
 from flask_bcrypt import generate_password_hash, check_password_hash
 
+logger = logging.getLogger(__name__)
+
+class UserCache:
+    """Cache em memória (por processo) dos documentos de usuário por UID.
+
+    Guarda os dados brutos com TTL; cada acerto gera um User novo, então
+    alterações feitas por uma requisição não vazam para outras. Com TTL 0
+    o cache fica desativado.
+    """
+
+    def __init__(self, ttl=0, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, uid):
+        if not self.ttl:
+            return None
+        entry = self._entries.get(uid)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            self.invalidate(uid)
+            return None
+        return data
+
+    def put(self, uid, data):
+        if not self.ttl:
+            return
+        with self._lock:
+            self._entries[uid] = (time.monotonic() + self.ttl, data)
+            while len(self._entries) > self.max_size:
+                del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._entries.pop(uid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache(Config.USER_CACHE_TTL, Config.USER_CACHE_SIZE)
+
+# Reservas de e-mail: um documento por e-mail garante a unicidade na criação
+EMAIL_COLLECTION = 'user_emails'
+
+class EmailInUseError(Exception):
+    """O e-mail já está reservado por outro usuário"""
+
+def email_key(email):
+    """ID do documento de reserva (o e-mail pode conter caracteres inválidos em IDs)"""
+    return hashlib.sha256(email.encode('utf-8')).hexdigest()
+
 class User:
+    # Sem __dict__ por instância: usuários são criados a cada requisição
+    # autenticada e mantidos aos milhares no cache em memória
+    __slots__ = (
+        'uid', 'email', 'password_hash', 'google_id', 'name', 'created_at', 'has_password',
+        'version', 'login_count', 'last_login', 'roles', 'roles_version', '_stored'
+    )
+
     def __init__(self, uid=None, email=None, password_hash=None, google_id=None, 
-                 name=None, created_at=None, has_password=False):
+                 name=None, created_at=None, has_password=False, version=0,
+                 login_count=0, last_login=None, roles=None, roles_version=0):
         self.uid = uid
         self.email = email
         self.password_hash = password_hash
@@ -12,6 +85,19 @@ class User:
         self.name = name
         self.created_at = created_at or datetime.utcnow()
         self.has_password = has_password
+        # Incrementada atomicamente a cada save(); base dos ETags das respostas do usuário
+        self.version = version
+        # Mantidos por app.login_stats (incrementos agrupados), nunca gravados
+        # por save() para não sobrescrever contagens de outros workers
+        self.login_count = login_count
+        self.last_login = last_login
+        # Papéis (app.permissions); a versão muda a cada alteração e invalida
+        # os access tokens emitidos com a máscara anterior
+        self.roles = list(roles) if roles is not None else initial_roles(email)
+        self.roles_version = roles_version
+        # Documento como foi lido do banco (None para usuário novo): save()
+        # grava só o que mudou
+        self._stored = None
 
     def to_dict(self):
         return {
@@ -21,35 +107,172 @@ class User:
             'google_id': self.google_id,
             'name': self.name,
             'created_at': self.created_at,
-            'has_password': self.has_password
+            'has_password': self.has_password,
+            'version': self.version,
+            'roles': self.roles,
+            'roles_version': self.roles_version
         }
 
     @staticmethod
     def from_dict(data):
-        return User(
-            uid=data.get('uid'),
-            email=data.get('email'),
-            password_hash=data.get('password_hash'),
-            google_id=data.get('google_id'),
-            name=data.get('name'),
-            created_at=data.get('created_at'),
-            has_password=data.get('has_password', False)
-        )
+        # Caminho rápido (toda requisição autenticada): atribuição direta
+        # nos slots, sem __init__ nem argumentos nomeados
+        user = User.__new__(User)
+        get = data.get
+        user.uid = get('uid')
+        user.email = get('email')
+        user.password_hash = get('password_hash')
+        user.google_id = get('google_id')
+        user.name = get('name')
+        user.created_at = get('created_at') or datetime.utcnow()
+        user.has_password = get('has_password', False)
+        user.version = get('version', 0)
+        user.login_count = get('login_count', 0)
+        user.last_login = get('last_login')
+        roles = get('roles')
+        user.roles = list(roles) if roles is not None else initial_roles(user.email)
+        user.roles_version = get('roles_version', 0)
+        user._stored = data
+        return user
+
+    @staticmethod
+    def from_snapshot(doc):
+        """Usuário a partir de um DocumentSnapshot (o UID é o ID do documento)"""
+        data = doc.to_dict()
+        data['uid'] = doc.id
+        return User.from_dict(data)
+
+    @property
+    def _stored_flags(self):
+        """Estado gravado (has_password, vinculado ao Google) para os contadores
+        agregados; None enquanto o usuário não existir no banco"""
+        if self._stored is None:
+            return None
+        return (self._stored.get('has_password', False), self._stored.get('google_id') is not None)
+
+    def changed_fields(self):
+        """Campos de to_dict() diferentes do documento lido (todos, se o usuário não veio do banco)"""
+        data = self.to_dict()
+        if self._stored is None:
+            return data
+        return {key: value for key, value in data.items()
+                if key != 'version' and self._stored.get(key) != value}
 
     def save(self):
-        """Salvar usuário no Firestore"""
+        """Salvar usuário no Firestore (set na criação; depois, update só dos campos alterados)"""
         db = get_db()
         if db is None:
             return False
         
         try:
             user_ref = db.collection('users').document(self.uid)
-            user_ref.set(self.to_dict())
+            deltas = user_deltas(self._stored_flags, self)
+            data = self.changed_fields()
+            if not data:
+                return True
+            # A versão é incrementada no servidor: dois saves concorrentes
+            # nunca gravam a mesma versão com conteúdos diferentes
+            data['version'] = increment(db)
+            if self._stored is None:
+                call_firestore(user_ref.set, data, merge=True, idempotent=False)
+            else:
+                # Só os campos alterados: o hash bcrypt e os demais não são regravados
+                call_firestore(user_ref.update, data, idempotent=False)
+            self._refresh(user_ref, data, deltas)
             return True
         except Exception as e:
-            print(f"Erro ao salvar usuário: {e}")
+            user_cache.invalidate(self.uid)
+            logger.exception("Erro ao salvar usuário", extra={'uid': self.uid})
             return False
 
+    def create(self):
+        """Criar um usuário novo reservando o e-mail na mesma escrita.
+
+        A reserva (coleção user_emails, chave derivada do e-mail) e o
+        documento do usuário são criados com create() em um único WriteBatch:
+        se o e-mail já estiver reservado nada é gravado e EmailInUseError é
+        lançada. Outros erros retornam False, como em save().
+        """
+        db = get_db()
+        if db is None:
+            return False
+        
+        try:
+            user_ref = db.collection('users').document(self.uid)
+            email_ref = db.collection(EMAIL_COLLECTION).document(email_key(self.email))
+            deltas = user_deltas(self._stored_flags, self)
+            data = self.to_dict()
+            data['version'] = 1
+            batch = db.batch()
+            batch.create(email_ref, {'email': self.email, 'uid': self.uid, 'created_at': self.created_at})
+            batch.create(user_ref, data)
+            try:
+                call_firestore(batch.commit)
+            except Exception as e:
+                if not is_already_exists(e):
+                    raise
+                # Um retry do commit depois de uma resposta perdida também cai
+                # aqui: a reserva é deste usuário e a criação já foi aplicada
+                owner = call_firestore(email_ref.get).to_dict() or {}
+                if owner.get('uid') != self.uid:
+                    raise EmailInUseError(self.email) from e
+                self._reload(user_ref)
+            else:
+                # create() grava a versão 1 literal: o estado local já é o gravado
+                self._apply(data)
+            self._count(deltas)
+            return True
+        except EmailInUseError:
+            raise
+        except Exception as e:
+            user_cache.invalidate(self.uid)
+            logger.exception("Erro ao criar usuário", extra={'uid': self.uid})
+            return False
+
+    def _refresh(self, user_ref, written, deltas):
+        """Depois de um save: ler de volta só a versão gerada pelo incremento.
+
+        Se ela é a seguinte à versão carregada, nenhuma outra escrita se
+        intercalou e o estado local mais os campos gravados é o documento;
+        senão o documento inteiro é relido, para versão e conteúdo ficarem juntos.
+        """
+        base = self._stored.get('version', 0) if self._stored is not None else 0
+        version = (call_firestore(user_ref.get, field_paths=['version']).to_dict() or {}).get('version')
+        if version == base + 1:
+            stored = dict(self._stored or {})
+            stored.update(written)
+            stored['version'] = version
+            self._apply(stored)
+        else:
+            self._reload(user_ref)
+        self._count(deltas)
+
+    def _apply(self, stored):
+        """Adotar `stored` como o documento gravado (e colocá-lo no cache)"""
+        stored['uid'] = self.uid
+        stored['roles'] = list(self.roles)
+        self.version = stored['version']
+        self._stored = stored
+        user_cache.put(self.uid, stored)
+
+    def _reload(self, user_ref):
+        """Reler o documento gravado inteiro (versão e conteúdo juntos)"""
+        doc = call_firestore(user_ref.get)
+        stored = doc.to_dict()
+        stored['uid'] = doc.id
+        fresh = User.from_dict(stored)
+        for key in list(fresh.to_dict()) + ['login_count', 'last_login', '_stored']:
+            setattr(self, key, getattr(fresh, key))
+        user_cache.put(self.uid, stored)
+
+    def _count(self, deltas):
+        """Atualizar os contadores agregados depois de uma escrita"""
+        try:
+            user_stats.increment(deltas)
+        except Exception as e:
+            # O usuário foi salvo; os totais podem ser refeitos com `flask recount-user-stats`
+            logger.warning("Erro ao atualizar estatísticas agregadas: %s", e, extra={'uid': self.uid})
+
     @staticmethod
     def find_by_email(email):
         """Buscar usuário por email"""
@@ -60,37 +283,40 @@ class User:
         try:
             users_ref = db.collection('users')
             query = users_ref.where('email', '==', email).limit(1)
-            docs = query.stream()
+            docs = call_firestore(lambda **options: list(query.stream(**options)))
             
             for doc in docs:
-                data = doc.to_dict()
-                data['uid'] = doc.id
-                return User.from_dict(data)
+                return User.from_snapshot(doc)
             
             return None
         except Exception as e:
-            print(f"Erro ao buscar usuário por email: {e}")
+            logger.exception("Erro ao buscar usuário por email")
             return None
 
     @staticmethod
     def find_by_uid(uid):
         """Buscar usuário por UID"""
+        cached = user_cache.get(uid)
+        if cached is not None:
+            return User.from_dict(cached)
+        
         db = get_db()
         if db is None:
             return None
         
         try:
             user_ref = db.collection('users').document(uid)
-            doc = user_ref.get()
+            doc = call_firestore(user_ref.get)
             
             if doc.exists:
                 data = doc.to_dict()
                 data['uid'] = doc.id
+                user_cache.put(uid, data)
                 return User.from_dict(data)
             
             return None
         except Exception as e:
-            print(f"Erro ao buscar usuário por UID: {e}")
+            logger.exception("Erro ao buscar usuário por UID", extra={'uid': uid})
             return None
 
     @staticmethod
@@ -103,28 +329,74 @@ class User:
         try:
             users_ref = db.collection('users')
             query = users_ref.where('google_id', '==', google_id).limit(1)
-            docs = query.stream()
+            docs = call_firestore(lambda **options: list(query.stream(**options)))
             
             for doc in docs:
-                data = doc.to_dict()
-                data['uid'] = doc.id
-                return User.from_dict(data)
+                return User.from_snapshot(doc)
             
             return None
         except Exception as e:
-            print(f"Erro ao buscar usuário por Google ID: {e}")
+            logger.exception("Erro ao buscar usuário por Google ID")
             return None
 
+    @property
+    def permissions(self):
+        """Bitmask das permissões concedidas pelos papéis"""
+        return permission_mask(self.roles)
+
+    def set_roles(self, roles):
+        """Trocar os papéis (ValueError para papéis desconhecidos); retorna True se mudaram"""
+        roles = validate_roles(roles)
+        if roles == sorted(self.roles):
+            return False
+        self.roles = roles
+        self.roles_version += 1
+        return True
+
     def set_password(self, password):
         """Definir senha com hash"""
-        self.password_hash = generate_password_hash(password).decode('utf-8')
+        self.password_hash = run_blocking(generate_password_hash, password).decode('utf-8')
         self.has_password = True
 
     def check_password(self, password):
         """Verificar senha"""
         if not self.password_hash:
             return False
-        return check_password_hash(self.password_hash, password)
+        return run_blocking(check_password_hash, self.password_hash, password)
+
+    @staticmethod
+    def scan(fields=None, page_size=500, start_after=None):
+        """Percorrer a coleção users em ordem de UID, uma página por leitura.
+
+        Gera os dicionários dos documentos (com 'uid'), começando depois do
+        UID `start_after`. Com `fields`, só esses campos são lidos do banco
+        (projeção). A memória usada é a de uma página, qualquer que seja o
+        tamanho da coleção.
+        """
+        db = get_db()
+        if db is None:
+            return
+        while True:
+            query = db.collection('users').order_by(DOCUMENT_ID)
+            if fields is not None:
+                query = query.select(fields)
+            if start_after is not None:
+                query = query.start_after({DOCUMENT_ID: start_after})
+            query = query.limit(page_size)
+            docs = call_firestore(lambda **options: list(query.stream(**options)))
+            for doc in docs:
+                data = doc.to_dict()
+                data['uid'] = doc.id
+                yield data
+            if len(docs) < page_size:
+                return
+            start_after = docs[-1].id
+
+    @staticmethod
+    def all_users():
+        """Iterar sobre todos os usuários (varredura completa paginada; uso administrativo)"""
+        for data in User.scan():
+            yield User.from_dict(data)
 
     def update_password(self, new_password):
         """Atualizar senha do usuário"""
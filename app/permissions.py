@@ -0,0 +1,65 @@
+"""
+Papéis e permissões compilados em bitmask
+
+Cada papel concede um conjunto de permissões (bits). Na emissão do access
+token os papéis do usuário são compilados em uma única máscara (claim
+`perm`), e a autorização por requisição é um teste de bit no token, sem
+acesso ao banco. A claim `pv` carrega a versão dos papéis: ao alterá-los,
+a versão anterior é revogada e os access tokens antigos deixam de valer;
+o cliente obtém um token novo, já com a máscara atual, via /auth/refresh.
+"""
+
+import enum
+
+from app.config import Config
+
+class Permission(enum.IntFlag):
+    VIEW_ADMIN = 1 << 0      # painel /api/admin
+    LIST_USERS = 1 << 1      # listagem /api/admin/users
+    EXPORT_USERS = 1 << 2    # exportação /api/admin/users/export
+    MANAGE_ROLES = 1 << 3    # alteração de papéis
+
+ROLES = {
+    'user': Permission(0),
+    'support': Permission.VIEW_ADMIN | Permission.LIST_USERS,
+    'admin': Permission.VIEW_ADMIN | Permission.LIST_USERS | Permission.EXPORT_USERS | Permission.MANAGE_ROLES,
+}
+
+DEFAULT_ROLES = ('user',)
+
+def permission_mask(roles):
+    """Máscara (int) com a união das permissões dos papéis; papéis desconhecidos não concedem nada"""
+    mask = Permission(0)
+    for role in roles or ():
+        mask |= ROLES.get(role, Permission(0))
+    return int(mask)
+
+def initial_roles(email):
+    """Papéis de um usuário novo: 'admin' para os e-mails em ADMIN_EMAILS"""
+    if email and email.lower() in Config.ADMIN_EMAILS:
+        return ['admin']
+    return list(DEFAULT_ROLES)
+
+def validate_roles(roles):
+    """Lista de papéis normalizada; ValueError para papéis desconhecidos"""
+    if not isinstance(roles, (list, tuple)) or not all(isinstance(role, str) for role in roles):
+        raise ValueError('roles must be a list of role names')
+    unknown = [role for role in roles if role not in ROLES]
+    if unknown:
+        raise ValueError(f"Unknown roles: {', '.join(unknown)}")
+    return sorted(set(roles))
+
+def change_roles(user, roles):
+    """Gravar novos papéis e revogar os access tokens da versão anterior.
+
+    Retorna True se os papéis mudaram; ValueError para papéis desconhecidos
+    e RuntimeError se o usuário não pôde ser salvo.
+    """
+    from app.tokens import revoke_permissions
+    previous_version = user.roles_version
+    if not user.set_roles(roles):
+        return False
+    if not user.save():
+        raise RuntimeError('Error saving user')
+    revoke_permissions(user.uid, previous_version)
+    return True
@@ -0,0 +1,208 @@
+"""
+Lista de revogação de tokens (jti) com filtro de Bloom
+
+A verificação por requisição é O(1) e não acessa o banco: o filtro de
+Bloom descarta rapidamente os tokens nunca revogados (caso comum) e só os
+positivos são confirmados no conjunto exato. Cada entrada expira no `exp`
+do token revogado. Entre workers, as revogações são propagadas por um
+backend plugável, lido por uma thread em segundo plano de cada processo:
+nenhuma requisição espera pelo banco, ao custo de até `sync_interval`
+segundos até que outro worker enxergue uma revogação.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Filtro de Bloom com double hashing sobre blake2b"""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class MemoryRevocationBackend:
+    """Backend local: não compartilha revogações com outros processos"""
+
+    shared = False
+
+    def publish(self, key, expires_at):
+        pass
+
+    def claim(self, key, expires_at):
+        return True
+
+    def fetch_since(self, since):
+        return []
+
+class FirestoreRevocationBackend:
+    """Revogações gravadas na coleção `revoked_tokens` e lidas por todos os workers.
+
+    Documentos vencidos podem ser removidos por uma política de TTL do
+    Firestore sobre o campo `expires_at`.
+    """
+
+    collection_name = 'revoked_tokens'
+    shared = True
+
+    def _document(self, key):
+        from app import get_db
+        return get_db().collection(self.collection_name).document(key)
+
+    def publish(self, key, expires_at):
+        from app.firestore_client import call_firestore
+        ref = self._document(key)
+        call_firestore(ref.set, {'key': key, 'expires_at': expires_at, 'revoked_at': time.time()})
+
+    def claim(self, key, expires_at):
+        """Criar o documento só se ele ainda não existir (atômico no Firestore)"""
+        from app.firestore_client import call_firestore, is_already_exists
+        ref = self._document(key)
+        try:
+            call_firestore(ref.create, {'key': key, 'expires_at': expires_at, 'revoked_at': time.time()})
+        except Exception as e:
+            if is_already_exists(e):
+                return False
+            raise
+        return True
+
+    def fetch_since(self, since):
+        from app import get_db
+        from app.firestore_client import call_firestore
+        db = get_db()
+        query = db.collection(self.collection_name).where('revoked_at', '>', since)
+        docs = call_firestore(lambda **options: list(query.stream(**options)))
+        return [(doc.to_dict()['key'], doc.to_dict()['expires_at']) for doc in docs]
+
+class RevocationList:
+    """Conjunto de chaves revogadas (jti ou família) com expiração automática"""
+
+    def __init__(self, backend=None, capacity=100000, error_rate=0.001, sync_interval=5.0,
+                 purge_interval=60.0):
+        self.backend = backend or MemoryRevocationBackend()
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+        self._entries = {}
+        # Chaves com claim em andamento no backend (ainda não revogadas localmente)
+        self._claiming = set()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self._synced_until = 0.0
+        self._next_purge = time.time() + purge_interval
+        self._worker_pid = None
+
+    def _add_local(self, key, expires_at):
+        with self._lock:
+            self._entries[key] = expires_at
+            self._bloom.add(key)
+
+    def revoke(self, key, expires_at):
+        """Revogar uma chave até `expires_at` (epoch) e propagar aos outros workers"""
+        if expires_at <= time.time():
+            return
+        self._ensure_worker()
+        self._add_local(key, expires_at)
+        try:
+            self.backend.publish(key, expires_at)
+        except Exception as e:
+            logger.error("Erro ao publicar revogação: %s", e)
+
+    def claim(self, key, expires_at):
+        """Revogar a chave só se ainda não estiver revogada.
+
+        Retorna False se outra requisição (deste ou de outro worker, via
+        backend) já a revogou; usado para consumir refresh tokens uma vez.
+        """
+        self._ensure_worker()
+        now = time.time()
+        with self._lock:
+            current = self._entries.get(key)
+            if (current is not None and current > now) or key in self._claiming:
+                return False
+            self._claiming.add(key)
+        # A chave só é marcada localmente depois do backend: se ele falhar, o
+        # retry do cliente não é confundido com reuso do token
+        try:
+            claimed = self.backend.claim(key, expires_at)
+        finally:
+            with self._lock:
+                self._claiming.discard(key)
+        # Reivindicada aqui ou já consumida em outro worker: revogada nos dois casos
+        self._add_local(key, max(expires_at, now))
+        return claimed
+
+    def is_revoked(self, key):
+        self._ensure_worker()
+        if key not in self._bloom:
+            return False
+        expires_at = self._entries.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def _ensure_worker(self):
+        """Iniciar a thread de sincronização/limpeza uma vez por processo (seguro após fork)"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='revocation-sync', daemon=True)
+        thread.start()
+
+    def _run(self):
+        interval = self.sync_interval if self.backend.shared else self.purge_interval
+        while True:
+            if self.backend.shared:
+                self.sync()
+            if time.time() >= self._next_purge:
+                self.purge_expired()
+            time.sleep(interval)
+
+    def sync(self):
+        """Trazer do backend as revogações feitas por outros workers"""
+        now = time.time()
+        try:
+            since = self._synced_until
+            for key, expires_at in self.backend.fetch_since(since):
+                self._add_local(key, expires_at)
+            # Sobreposição de um intervalo para tolerar relógios e escritas concorrentes
+            self._synced_until = max(since, now - self.sync_interval)
+        except Exception as e:
+            logger.error("Erro ao sincronizar revogações: %s", e)
+
+    def purge_expired(self, now=None):
+        """Remover entradas vencidas e reconstruir o filtro de Bloom"""
+        now = now or time.time()
+        with self._lock:
+            self._entries = {key: exp for key, exp in self._entries.items() if exp > now}
+            bloom = BloomFilter(max(self.capacity, len(self._entries) * 2), self.error_rate)
+            for key in self._entries:
+                bloom.add(key)
+            self._bloom = bloom
+            self._next_purge = now + self.purge_interval
+
+    def __len__(self):
+        return len(self._entries)
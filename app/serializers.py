@@ -0,0 +1,78 @@
+"""
+Serialização das visões públicas do usuário
+
+A visão pública (uid/email/name/has_password/google_id) é renderizada uma
+única vez por versão do usuário e reutilizada como fragmento JSON pronto
+quando o provedor JSON suporta fragmentos (orjson).
+"""
+
+import threading
+
+from app.config import Config
+from app.json_provider import get_json_provider_class, orjson
+
+# Decidido uma vez pelo provedor configurado: consultar current_app.json a
+# cada chamada custaria mais que a serialização economizada
+USE_FRAGMENTS = getattr(get_json_provider_class(Config.JSON_PROVIDER), 'supports_fragments', False)
+
+PUBLIC_USER_FIELDS = ('uid', 'email', 'name', 'has_password', 'google_id')
+SUMMARY_USER_FIELDS = ('uid', 'email', 'name')
+# Campos que a listagem administrativa pode ler do banco (nunca password_hash)
+LISTABLE_USER_FIELDS = (
+    'email', 'name', 'google_id', 'has_password', 'created_at', 'version', 'login_count', 'last_login',
+    'roles'
+)
+
+class UserViewCache:
+    """Cache limitado de visões de usuário já serializadas.
+
+    Leituras não usam lock (dict.get é atômico); ao atingir o limite, as
+    entradas mais antigas são descartadas (FIFO).
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_size:
+                del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_cache = UserViewCache(Config.USER_VIEW_CACHE_SIZE)
+
+def user_view(user, fields=PUBLIC_USER_FIELDS):
+    """Montar o dicionário da visão pública do usuário"""
+    view = {}
+    for field in fields:
+        if field == 'google_id':
+            view[field] = user.google_id is not None
+        else:
+            view[field] = getattr(user, field)
+    return view
+
+def public_user(user, fields=PUBLIC_USER_FIELDS):
+    """Visão pública do usuário pronta para jsonify.
+
+    Com o provedor orjson retorna um orjson.Fragment em cache; caso
+    contrário (ou para usuário ainda não salvo), o dicionário comum.
+    """
+    if not USE_FRAGMENTS or not user.version:
+        return user_view(user, fields)
+
+    # A versão muda a cada save (incremento atômico), então identifica o conteúdo
+    key = (fields, user.uid, user.version)
+    fragment = _cache.get(key)
+    if fragment is None:
+        fragment = orjson.Fragment(orjson.dumps(user_view(user, fields), option=orjson.OPT_SORT_KEYS))
+        _cache.put(key, fragment)
+    return fragment
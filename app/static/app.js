@@ -1,6 +1,13 @@
 // Application state
 let currentUser = null;
 let authToken = null;
+let refreshToken = null;
+
+// Token validation: seconds of clock skew tolerated when checking "exp"
+// locally, and how long a validated token is trusted when the server
+// does not send a "revalidate_after" hint
+const TOKEN_EXPIRY_SKEW_SECONDS = 30;
+const DEFAULT_REVALIDATE_SECONDS = 60;
 
 // DOM elements
 let authSection, mainSection, userInfo, userName, alertContainer;
@@ -216,6 +223,7 @@ async function handleLogin(e) {
     if (data.success) {
       showAlert(data.message, "success");
       setAuthData(data.data.user, data.data.token);
+      setRefreshToken(data.data.refresh_token);
       showMainSection();
     } else {
       showAlert(data.message, "error");
@@ -249,6 +257,7 @@ async function handleRegister(e) {
     if (data.success) {
       showAlert(data.message, "success");
       setAuthData(data.data.user, data.data.token);
+      setRefreshToken(data.data.refresh_token);
       showMainSection();
     } else {
       showAlert(data.message, "error");
@@ -271,11 +280,10 @@ async function handleSetPassword(e) {
   }
 
   try {
-    const response = await fetch("/auth/set-password", {
+    const response = await authFetch("/auth/set-password", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
-        Authorization: `Bearer ${authToken}`,
       },
       body: JSON.stringify({ password }),
     });
@@ -333,7 +341,7 @@ async function handleGoogleCallback(token, userId) {
     const data = await response.json();
 
     if (data.success) {
-      setAuthData(data.data.user, token);
+      setAuthData(data.data.user, token, data.data.revalidate_after);
       showMainSection();
       showAlert("Google login successful!", "success");
     } else {
@@ -348,22 +356,155 @@ async function handleGoogleCallback(token, userId) {
 }
 
 function handleLogout() {
+  // Revoke tokens server-side; local logout does not wait for it
+  if (authToken) {
+    fetch("/auth/logout", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${authToken}`,
+      },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    }).catch(() => {});
+  }
+  clearAuthData();
+
+  showAuthSection();
+  showAlert("Logout successful", "success");
+}
+
+function clearAuthData() {
   localStorage.removeItem("authToken");
   localStorage.removeItem("currentUser");
+  localStorage.removeItem("tokenValidatedUntil");
+  localStorage.removeItem("refreshToken");
   currentUser = null;
   authToken = null;
+  refreshToken = null;
+}
 
-  showAuthSection();
-  showAlert("Logout successful", "success");
+function setRefreshToken(token) {
+  refreshToken = token || null;
+  if (refreshToken) {
+    localStorage.setItem("refreshToken", refreshToken);
+  } else {
+    localStorage.removeItem("refreshToken");
+  }
 }
 
-function setAuthData(user, token) {
+// Exchange the refresh token for a new access token (the refresh token rotates).
+// Concurrent callers share one request: presenting a rotated refresh token
+// twice would be treated as reuse and revoke the whole session
+let refreshInFlight = null;
+
+function refreshAccessToken() {
+  if (!refreshInFlight) {
+    refreshInFlight = doRefreshAccessToken().finally(() => {
+      refreshInFlight = null;
+    });
+  }
+  return refreshInFlight;
+}
+
+async function doRefreshAccessToken() {
+  if (!refreshToken) return false;
+  try {
+    const response = await fetch("/auth/refresh", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+
+    const data = await response.json();
+
+    if (data.success) {
+      authToken = data.data.token;
+      localStorage.setItem("authToken", authToken);
+      setRefreshToken(data.data.refresh_token);
+      markTokenValidated(authToken, DEFAULT_REVALIDATE_SECONDS);
+      return true;
+    }
+  } catch (error) {
+    console.error("Error refreshing token:", error);
+  }
+  return false;
+}
+
+// fetch with the access token: refreshes it first when it has expired and,
+// on a 401, refreshes and retries once
+async function authFetch(url, options = {}) {
+  if (authToken && isTokenExpired(authToken)) {
+    await refreshAccessToken();
+  }
+  const send = () =>
+    fetch(url, {
+      ...options,
+      headers: {
+        ...(options.headers || {}),
+        ...(authToken ? { Authorization: `Bearer ${authToken}` } : {}),
+      },
+    });
+  let response = await send();
+  if (response.status === 401 && refreshToken && (await refreshAccessToken())) {
+    response = await send();
+  }
+  return response;
+}
+
+function setAuthData(
+  user,
+  token,
+  revalidateAfter = DEFAULT_REVALIDATE_SECONDS
+) {
   currentUser = user;
   authToken = token;
 
   // Save to localStorage
   localStorage.setItem("authToken", token);
   localStorage.setItem("currentUser", JSON.stringify(user));
+  markTokenValidated(token, revalidateAfter);
+}
+
+// Decode the JWT payload (no signature check, only used to read "exp")
+function decodeTokenPayload(token) {
+  try {
+    const payload = token.split(".")[1];
+    const base64 = payload.replace(/-/g, "+").replace(/_/g, "/");
+    const padded = base64.padEnd(Math.ceil(base64.length / 4) * 4, "=");
+    return JSON.parse(atob(padded));
+  } catch (error) {
+    return null;
+  }
+}
+
+function isTokenExpired(token) {
+  const payload = decodeTokenPayload(token);
+  if (!payload || typeof payload.exp !== "number") return true;
+  return payload.exp - TOKEN_EXPIRY_SKEW_SECONDS <= Date.now() / 1000;
+}
+
+// Trust a validated token for a short window (never past its "exp")
+function markTokenValidated(token, revalidateAfter) {
+  const payload = decodeTokenPayload(token);
+  const seconds =
+    typeof revalidateAfter === "number"
+      ? revalidateAfter
+      : DEFAULT_REVALIDATE_SECONDS;
+  let validatedUntil = Date.now() + seconds * 1000;
+  if (payload && typeof payload.exp === "number") {
+    validatedUntil = Math.min(
+      validatedUntil,
+      (payload.exp - TOKEN_EXPIRY_SKEW_SECONDS) * 1000
+    );
+  }
+  localStorage.setItem("tokenValidatedUntil", String(validatedUntil));
+}
+
+function isTokenRecentlyValidated() {
+  const validatedUntil = Number(localStorage.getItem("tokenValidatedUntil"));
+  return validatedUntil > Date.now();
 }
 
 function checkStoredAuth() {
@@ -371,9 +512,31 @@ function checkStoredAuth() {
   const storedUser = localStorage.getItem("currentUser");
 
   if (storedToken && storedUser) {
+    refreshToken = localStorage.getItem("refreshToken");
+
+    // Expired access tokens are renewed with the refresh token, or dropped
+    if (isTokenExpired(storedToken)) {
+      currentUser = JSON.parse(storedUser);
+      refreshAccessToken().then((refreshed) => {
+        if (refreshed) {
+          showMainSection();
+        } else {
+          clearAuthData();
+          showAuthSection();
+        }
+      });
+      return;
+    }
+
     authToken = storedToken;
     currentUser = JSON.parse(storedUser);
 
+    // Skip the validate-token call if the token was validated recently
+    if (isTokenRecentlyValidated()) {
+      showMainSection();
+      return;
+    }
+
     // Validate token
     validateToken(storedToken);
   }
@@ -392,6 +555,12 @@ async function validateToken(token) {
     const data = await response.json();
 
     if (data.success) {
+      currentUser = data.data.user;
+      localStorage.setItem("currentUser", JSON.stringify(currentUser));
+      markTokenValidated(token, data.data.revalidate_after);
+      showMainSection();
+    } else if (await refreshAccessToken()) {
+      // Access token rejected (expired or revoked), refreshed instead
       showMainSection();
     } else {
       // Invalid token, clear data
@@ -483,14 +652,11 @@ async function testEndpoint(endpoint, method = "GET", useToken = false) {
       "Content-Type": "application/json",
     };
 
-    if (useToken && authToken) {
-      headers["Authorization"] = `Bearer ${authToken}`;
-    }
-
-    const response = await fetch(endpoint, {
-      method,
-      headers,
-    });
+    const request = { method, headers };
+    const response =
+      useToken && authToken
+        ? await authFetch(endpoint, request)
+        : await fetch(endpoint, request);
 
     const data = await response.json();
 
@@ -0,0 +1,147 @@
+"""
+Assets estáticos pré-comprimidos e com fingerprint
+
+O build copia cada arquivo de app/static para app/static/build com o hash
+do conteúdo no nome (app.js -> app.3f2a9c1b7d4e.js), gera as variantes
+.gz e .br (brotli é opcional) e reescreve as referências no index.html.
+Os arquivos com fingerprint são servidos em /assets com cache imutável; o
+index.html é servido sem cache, mas também pré-comprimido.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+BUILD_DIR_NAME = 'build'
+MANIFEST_NAME = 'manifest.json'
+ASSETS_URL_PREFIX = '/assets/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ENTRY_POINT = 'index.html'
+
+# Extensões que valem a pena comprimir
+COMPRESSIBLE_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg', '.txt', '.map')
+
+def _source_files(static_dir):
+    for name in sorted(os.listdir(static_dir)):
+        path = os.path.join(static_dir, name)
+        if os.path.isfile(path):
+            yield name, path
+
+def _write_atomic(path, data):
+    # Vários workers podem rodar o build ao mesmo tempo
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _write_variants(build_dir, name, data):
+    """Gravar o arquivo e, se comprimível, as variantes .gz e .br"""
+    _write_atomic(os.path.join(build_dir, name), data)
+    if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+        return
+    _write_atomic(os.path.join(build_dir, name + '.gz'), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(os.path.join(build_dir, name + '.br'), brotli.compress(data, quality=11))
+
+def sources_digest(static_dir):
+    """Hash de todos os arquivos fonte, usado para detectar build desatualizado"""
+    digest = hashlib.sha256()
+    for name, path in _source_files(static_dir):
+        digest.update(name.encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    digest.update(b'brotli' if brotli is not None else b'')
+    return digest.hexdigest()
+
+def load_manifest(static_dir):
+    path = os.path.join(static_dir, BUILD_DIR_NAME, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def build_assets(static_dir):
+    """Gerar app/static/build e retornar o manifesto"""
+    build_dir = os.path.join(static_dir, BUILD_DIR_NAME)
+    os.makedirs(build_dir, exist_ok=True)
+
+    files = {}
+    for name, path in _source_files(static_dir):
+        if name == ENTRY_POINT:
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        fingerprinted = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        _write_variants(build_dir, fingerprinted, data)
+        files[name] = fingerprinted
+
+    # Reescrever /static/<arquivo> no index.html para /assets/<arquivo com hash>
+    with open(os.path.join(static_dir, ENTRY_POINT), encoding='utf-8') as f:
+        html = f.read()
+    html = re.sub(
+        r'/static/([\w.\-]+)',
+        lambda m: ASSETS_URL_PREFIX + files[m.group(1)] if m.group(1) in files else m.group(0),
+        html
+    )
+    _write_variants(build_dir, ENTRY_POINT, html.encode('utf-8'))
+
+    manifest = {'digest': sources_digest(static_dir), 'files': files}
+    _write_atomic(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+def fingerprinted_names(manifest):
+    """Nomes com hash que podem ser servidos em /assets (nunca o index.html)"""
+    return frozenset(manifest.get('files', {}).values()) if manifest else frozenset()
+
+def ensure_assets(static_dir):
+    """Rodar o build só se o manifesto não existir ou estiver desatualizado"""
+    manifest = load_manifest(static_dir)
+    if manifest is None or manifest.get('digest') != sources_digest(static_dir):
+        manifest = build_assets(static_dir)
+    return manifest
+
+def _accepted_encodings():
+    accepted = request.accept_encodings
+    encodings = []
+    if brotli is not None and accepted['br']:
+        encodings.append(('br', '.br'))
+    if accepted['gzip']:
+        encodings.append(('gzip', '.gz'))
+    return encodings
+
+def send_precompressed(filename, cache_control):
+    """Servir um arquivo do build escolhendo a variante pelo Accept-Encoding"""
+    build_dir = os.path.join(current_app.static_folder, BUILD_DIR_NAME)
+    path = safe_join(build_dir, filename)
+    if (path is None or filename == MANIFEST_NAME or filename.endswith(('.gz', '.br'))
+            or not os.path.isfile(path)):
+        abort(404)
+    encoding = None
+    for candidate, suffix in _accepted_encodings():
+        if os.path.exists(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    # O mimetype vem do nome original, não da extensão .gz/.br
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(path, mimetype=mimetype, conditional=True)
+    # send_file gera "inline; filename=<arquivo>.br" a partir do caminho
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = cache_control
+    return response
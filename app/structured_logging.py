@@ -0,0 +1,190 @@
+"""
+Logs estruturados sem bloquear as requisições
+
+As threads de requisição só criam o registro e o colocam em uma fila
+(QueueHandler); uma QueueListener em segundo plano formata cada registro
+como uma linha JSON e faz a escrita. Cada registro carrega o ID da
+requisição, método, caminho e o tempo decorrido desde o início dela.
+
+Em tempestades de erro o volume é limitado por mensagem: até `limit`
+avisos/erros de cada (logger, nível, mensagem) por janela de `window`
+segundos; acima disso só uma amostra (`sample_rate`) passa, e o próximo
+registro emitido informa quantos foram suprimidos. Com a fila cheia o
+registro é descartado e contado, em vez de bloquear.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+from app.config import Config
+from app.cooperative import cooperative
+
+# Atributos padrão de LogRecord; os demais (extra=...) vão para o JSON
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class RequestContextFilter(logging.Filter):
+    """Anexar ID da requisição e tempo decorrido (roda na thread que gera o log)"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = getattr(g, 'request_id', None)
+            record.method = request.method
+            record.path = request.path
+            started = getattr(g, 'request_started', None)
+            if started is not None:
+                record.elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Limitar registros repetidos por janela, amostrando o excedente"""
+
+    def __init__(self, limit=20, window=10.0, sample_rate=0.01):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.sample_rate = sample_rate
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        # Só avisos e erros são limitados; logs de acesso e depuração passam
+        if self.limit <= 0 or record.levelno < logging.WARNING:
+            return True
+        # A mensagem sem argumentos agrupa os erros iguais com dados diferentes
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                if len(self._windows) > 10000:
+                    self._windows.clear()
+                state = self._windows[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            state[1] += 1
+            if state[1] > self.limit and random.random() >= self.sample_rate:
+                state[2] += 1
+                return False
+            suppressed += state[2]
+            state[2] = 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (e conta) registros com a fila cheia"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        """Resolver mensagem e traceback aqui; o JSON é montado na listener"""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exception = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = record.exc_text = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener = None
+_handler = None
+
+def configure_logging(level=None):
+    """Instalar a fila no logger `app` (idempotente) e iniciar a listener"""
+    global _listener, _handler
+    if _handler is not None:
+        return _handler
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter())
+    if cooperative():
+        # Com gevent a listener seria só mais uma greenlet no mesmo thread,
+        # e uma greenlet criada antes do fork quebra o hub do worker
+        _handler = output
+    else:
+        log_queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        _handler = NonBlockingQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+    _handler.addFilter(RateLimitFilter(Config.LOG_RATE_LIMIT, Config.LOG_RATE_WINDOW, Config.LOG_SAMPLE_RATE))
+    _handler.addFilter(RequestContextFilter())
+
+    logger = logging.getLogger('app')
+    logger.setLevel(level or Config.LOG_LEVEL)
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+    # A thread da listener não sobrevive ao fork dos workers do Gunicorn
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener)
+    # Escrever o que ainda está na fila ao encerrar o processo
+    atexit.register(_stop_listener)
+    return _handler
+
+def _restart_listener():
+    """Fila e listener novos no processo filho (a fila herdada pode ter um lock preso)"""
+    global _listener
+    if _listener is None:
+        return
+    _handler.queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def init_request_logging(app):
+    """ID e início de cada requisição; com LOG_REQUESTS, uma linha de acesso por resposta"""
+    access_logger = logging.getLogger('app.request')
+    log_requests = app.config.get('LOG_REQUESTS')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        request_id = getattr(g, 'request_id', None)
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        if log_requests:
+            access_logger.info('request', extra={'status': response.status_code})
+        return response
@@ -0,0 +1,146 @@
+"""
+JWT issuing and validation
+
+Short-lived access tokens and rotating refresh tokens. Every token has a
+`jti`; refresh tokens also carry a family id (`fam`), and the whole family
+is revoked when an already-rotated refresh token is presented again.
+"""
+
+import importlib
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+from flask import current_app
+
+from app.config import Config, uses_simulator
+from app.revocation import FirestoreRevocationBackend, MemoryRevocationBackend, RevocationList
+
+ACCESS_TOKEN = 'access'
+REFRESH_TOKEN = 'refresh'
+
+class RevokedTokenError(jwt.InvalidTokenError):
+    """Valid token that has been revoked (logout or rotation)"""
+
+class RefreshTokenReuseError(RevokedTokenError):
+    """An already-rotated refresh token was presented again"""
+
+def _load_backend(name):
+    """'memory', 'firestore' or 'module:Class' for a custom backend"""
+    if name == 'memory':
+        return MemoryRevocationBackend()
+    if name == 'firestore':
+        # The simulator is per process: there is nothing to share, and the
+        # gunicorn config runs a single worker with it (gunicorn.conf.py)
+        if uses_simulator():
+            return MemoryRevocationBackend()
+        return FirestoreRevocationBackend()
+    module_name, _, class_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+revocation_list = RevocationList(
+    _load_backend(Config.REVOCATION_BACKEND),
+    capacity=Config.REVOCATION_CAPACITY,
+    sync_interval=Config.REVOCATION_SYNC_INTERVAL
+)
+
+def _encode(payload):
+    return jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+def permissions_key(user_id, roles_version):
+    """Revocation key shared by the access tokens of one roles version"""
+    return f'pv:{user_id}:{roles_version}'
+
+def generate_jwt_token(user):
+    """Generate short-lived access token for user.
+
+    The user's roles are compiled into the `perm` bitmask claim, so
+    permission checks need no database access; `pv` is the roles version
+    that revoke_permissions invalidates when the roles change.
+    """
+    now = datetime.utcnow()
+    payload = {
+        'user_id': user.uid,
+        'type': ACCESS_TOKEN,
+        'jti': uuid.uuid4().hex,
+        'perm': user.permissions,
+        'pv': user.roles_version,
+        'exp': now + timedelta(seconds=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']),
+        'iat': now
+    }
+    return _encode(payload)
+
+def generate_refresh_token(user_id, family=None):
+    """Generate refresh token; rotations keep the same family"""
+    now = datetime.utcnow()
+    payload = {
+        'user_id': user_id,
+        'type': REFRESH_TOKEN,
+        'jti': uuid.uuid4().hex,
+        'fam': family or uuid.uuid4().hex,
+        'exp': now + timedelta(seconds=current_app.config['JWT_REFRESH_TOKEN_EXPIRES']),
+        'iat': now
+    }
+    return _encode(payload)
+
+def decode_token(token, expected_type=ACCESS_TOKEN):
+    """Decode and check type and revocation; raises jwt.InvalidTokenError subclasses"""
+    payload = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    # Tokens issued before 'type' existed are access tokens
+    if payload.get('type', ACCESS_TOKEN) != expected_type:
+        raise jwt.InvalidTokenError('Wrong token type')
+    jti = payload.get('jti')
+    if jti and revocation_list.is_revoked(jti):
+        if expected_type == REFRESH_TOKEN:
+            raise RefreshTokenReuseError('Refresh token reused')
+        raise RevokedTokenError('Token revoked')
+    family = payload.get('fam')
+    if family and revocation_list.is_revoked('fam:' + family):
+        raise RevokedTokenError('Token revoked')
+    # Access tokens issued before a roles change carry an outdated bitmask
+    if 'pv' in payload and revocation_list.is_revoked(permissions_key(payload['user_id'], payload['pv'])):
+        raise RevokedTokenError('Token revoked')
+    return payload
+
+def revoke_token(payload):
+    """Revoke a decoded token until it would expire anyway"""
+    if payload.get('jti'):
+        revocation_list.revoke(payload['jti'], payload['exp'])
+
+def revoke_permissions(user_id, roles_version):
+    """Invalidate access tokens issued with `roles_version` (call after a roles change)"""
+    # Only access tokens carry the bitmask, so they bound the revocation lifetime
+    expires_at = time.time() + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    revocation_list.revoke(permissions_key(user_id, roles_version), expires_at)
+
+def revoke_family(payload):
+    """Revoke every refresh token of the payload's family"""
+    if payload.get('fam'):
+        # No token of the family outlives now + refresh token lifetime
+        expires_at = time.time() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        revocation_list.revoke('fam:' + payload['fam'], expires_at)
+
+def rotate_refresh_token(token):
+    """Consume a refresh token and return (user_id, access_token, refresh_token).
+
+    Presenting an already-rotated refresh token revokes its whole family.
+    """
+    try:
+        payload = decode_token(token, REFRESH_TOKEN)
+    except RefreshTokenReuseError:
+        # Possible token theft: invalidate the whole family
+        payload = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        revoke_family(payload)
+        raise
+    # Atomic check-and-revoke: of two concurrent refreshes with the same
+    # token only one wins, the other is treated as reuse
+    if not payload.get('jti') or not revocation_list.claim(payload['jti'], payload['exp']):
+        revoke_family(payload)
+        raise RefreshTokenReuseError('Refresh token reused')
+    # Reload the user so the new access token carries the current roles
+    from app.models import User
+    user = User.find_by_uid(payload['user_id'])
+    if not user:
+        raise jwt.InvalidTokenError('User not found')
+    return user.uid, generate_jwt_token(user), generate_refresh_token(user.uid, payload['fam'])
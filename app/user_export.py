@@ -0,0 +1,123 @@
+"""
+Exportação em streaming da coleção users (NDJSON ou CSV, opcionalmente gzip)
+
+Pipeline de geradores: User.scan lê uma página de cada vez (com projeção
+dos campos pedidos), cada documento passa pela redação e é codificado em
+uma linha; a saída pode ainda ser comprimida em gzip incrementalmente. A
+memória usada é a de uma página, qualquer que seja o número de usuários.
+Usado pelo comando `flask export-users` e por /api/admin/users/export.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import time
+import zlib
+from datetime import datetime
+
+from app.serializers import LISTABLE_USER_FIELDS
+
+FORMATS = ('ndjson', 'csv')
+
+# Saída comprimida liberada a cada ~64 KB de entrada
+GZIP_FLUSH_SIZE = 64 * 1024
+
+# Separador dos valores de campos-lista (roles) em uma célula do CSV
+CSV_LIST_DELIMITER = '|'
+
+def parse_fields(value, default=LISTABLE_USER_FIELDS):
+    """Lista separada por vírgulas -> tupla de campos; ValueError para campos desconhecidos"""
+    if not value:
+        return tuple(default)
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in LISTABLE_USER_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}")
+    return fields
+
+def pseudonymize(value):
+    """Substituir um valor por um hash estável (permite junções sem expor o dado)"""
+    if value is None:
+        return None
+    return hashlib.sha256(str(value).encode('utf-8')).hexdigest()[:16]
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def export_rows(fields, redact=(), page_size=500, progress=None, progress_every=None):
+    """Gerar os usuários como dicionários (uid + `fields`), com `redact` pseudonimizados.
+
+    `progress(count, rate)` é chamado a cada `progress_every` usuários
+    (padrão: uma página) e ao final.
+    """
+    from app.models import User
+
+    progress_every = progress_every or page_size
+    started = time.perf_counter()
+    count = 0
+    for data in User.scan(fields, page_size):
+        row = {'uid': data['uid']}
+        for field in fields:
+            value = _plain(data.get(field))
+            row[field] = pseudonymize(value) if field in redact else value
+        yield row
+        count += 1
+        if progress and count % progress_every == 0:
+            progress(count, count / (time.perf_counter() - started))
+    if progress:
+        elapsed = time.perf_counter() - started
+        progress(count, count / elapsed if elapsed else 0.0)
+
+def encode_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+def _csv_cell(value):
+    """Listas viram uma célula só (admin|user), não o repr do Python"""
+    if isinstance(value, (list, tuple)):
+        return CSV_LIST_DELIMITER.join(str(item) for item in value)
+    return value
+
+def encode_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, ('uid',) + tuple(fields))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: _csv_cell(value) for key, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def gzip_chunks(chunks, level=6, flush_size=GZIP_FLUSH_SIZE):
+    """Comprimir um gerador de str em gzip, emitindo blocos à medida que avança"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        pending += len(data)
+        out = compressor.compress(data)
+        if pending >= flush_size:
+            out += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if out:
+            yield out
+    yield compressor.flush(zlib.Z_FINISH)
+
+def export_users(fmt='ndjson', fields=LISTABLE_USER_FIELDS, redact=(), compress=False,
+                 page_size=500, progress=None):
+    """Gerador dos bytes da exportação completa"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato inválido: {fmt}")
+    rows = export_rows(fields, redact, page_size, progress)
+    chunks = encode_csv(rows, fields) if fmt == 'csv' else encode_ndjson(rows)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
+
+def export_filename(fmt, compress):
+    stamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    return f"users-{stamp}.{fmt}{'.gz' if compress else ''}"
@@ -0,0 +1,243 @@
+"""
+Importação em massa de usuários (flask import-users)
+
+Lê os registros em streaming de um CSV ou NDJSON e os processa em lotes do
+tamanho de um WriteBatch do Firestore: valida, descarta e-mails já
+existentes, gera os hashes bcrypt das senhas em um pool de processos
+(ou aceita hashes bcrypt prontos em `password_hash`) e grava o lote com um
+único commit. Após cada commit um checkpoint registra quantos registros do
+arquivo já foram consumidos, de modo que uma importação interrompida pode
+ser retomada com --resume.
+
+O UID de cada usuário importado é derivado do e-mail (uuid5), então
+reimportar o mesmo arquivo não cria duplicatas.
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# Limite de escritas por WriteBatch no Firestore
+MAX_BATCH_WRITES = 500
+
+# Valores por consulta `in` do Firestore (o limite mais restritivo entre versões)
+MAX_IN_VALUES = 10
+
+IMPORT_NAMESPACE = uuid.UUID('5c8b2f4e-7a0d-4d2b-9a51-3e6f1c2d7b90')
+
+_BCRYPT_HASH = re.compile(r'^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$')
+
+def import_uid(email):
+    """UID determinístico do usuário importado"""
+    return str(uuid.uuid5(IMPORT_NAMESPACE, email))
+
+def read_records(path, fmt=None):
+    """Gerar os registros (dicionários) de um arquivo CSV ou NDJSON"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+def _hash_password(password, rounds):
+    """Executado nos processos do pool: (hash, erro)"""
+    try:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8'), None
+    except ValueError as e:
+        return None, str(e)
+
+def _parse_created_at(value):
+    if not value:
+        return datetime.utcnow()
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _prepare(record):
+    """Normalizar um registro; retorna (dados, senha em texto ou None) ou lança ValueError"""
+    email = (record.get('email') or '').strip().lower()
+    if not email or '@' not in email:
+        raise ValueError('email inválido')
+    password = record.get('password') or None
+    password_hash = record.get('password_hash') or None
+    if password_hash and not _BCRYPT_HASH.match(password_hash):
+        raise ValueError('password_hash não é um hash bcrypt')
+    if password and len(password) < 6:
+        raise ValueError('senha com menos de 6 caracteres')
+    data = {
+        'uid': import_uid(email),
+        'email': email,
+        'password_hash': password_hash,
+        'google_id': record.get('google_id') or None,
+        'name': record.get('name') or email.split('@')[0],
+        'created_at': _parse_created_at(record.get('created_at')),
+        'has_password': bool(password or password_hash),
+        'version': 1
+    }
+    return data, (password if not password_hash else None)
+
+def _existing_emails(db, emails):
+    """E-mails que já existem na coleção users (consultas `in` de até 10 valores)"""
+    from app.firestore_client import call_firestore
+    emails = list(emails)
+    existing = set()
+    for start in range(0, len(emails), MAX_IN_VALUES):
+        query = db.collection('users').where('email', 'in', emails[start:start + MAX_IN_VALUES]).select(['email'])
+        docs = call_firestore(lambda **options: list(query.stream(**options)))
+        existing.update(doc.to_dict().get('email') for doc in docs)
+    return existing
+
+def _commit_users(db, pending, attempts=3):
+    """Gravar usuários e reservas de e-mail em um WriteBatch; retorna os gravados.
+
+    Cada usuário leva o documento de reserva em user_emails (create), como
+    em User.create: um e-mail importado não pode ser cadastrado de novo. Se
+    um cadastro reservou algum dos e-mails desde a verificação, o lote
+    inteiro falha; os e-mails agora existentes são descartados e o lote é
+    refeito.
+    """
+    from app.firestore_client import call_firestore, is_already_exists
+    from app.models import EMAIL_COLLECTION, email_key
+
+    users = db.collection('users')
+    emails = db.collection(EMAIL_COLLECTION)
+    for attempt in range(attempts):
+        batch = db.batch()
+        for data, _ in pending:
+            batch.create(emails.document(email_key(data['email'])),
+                         {'email': data['email'], 'uid': data['uid'], 'created_at': data['created_at']})
+            batch.set(users.document(data['uid']), data)
+        try:
+            call_firestore(batch.commit)
+            return pending
+        except Exception as e:
+            if not is_already_exists(e):
+                raise
+            # Retry de um commit já aplicado: o lote é atômico, basta uma reserva nossa
+            data = pending[0][0]
+            owner = call_firestore(emails.document(email_key(data['email'])).get).to_dict() or {}
+            if owner.get('uid') == data['uid']:
+                return pending
+            if attempt == attempts - 1:
+                raise
+        existing = _existing_emails(db, [data['email'] for data, _ in pending])
+        pending = [(data, password) for data, password in pending if data['email'] not in existing]
+        if not pending:
+            return pending
+    return pending
+
+class Checkpoint:
+    """Progresso da importação gravado atomicamente em JSON"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, state):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+def import_users(records, batch_size=MAX_BATCH_WRITES // 2, workers=None, rounds=12,
+                 checkpoint=None, resume=False, report=None):
+    """Importar `records` em lotes; retorna os contadores finais.
+
+    `report(state, rate)` é chamado após cada lote com os contadores
+    acumulados e a taxa em registros por segundo.
+    """
+    from app import get_db
+    from app.firestore_client import call_firestore
+    from app.user_stats import user_deltas, user_stats
+    from app.models import User
+
+    # Duas escritas por usuário (documento + reserva do e-mail)
+    batch_size = max(1, min(batch_size, MAX_BATCH_WRITES // 2))
+    workers = workers or os.cpu_count() or 1
+    state = {'position': 0, 'imported': 0, 'skipped': 0, 'invalid': 0}
+    if resume and checkpoint is not None:
+        state.update(checkpoint.load())
+    records = islice(records, state['position'], None)
+
+    db = get_db()
+    started = time.perf_counter()
+    processed_at_start = state['position']
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = list(islice(records, batch_size))
+            if not chunk:
+                break
+
+            prepared = {}
+            for offset, record in enumerate(chunk):
+                try:
+                    data, password = _prepare(record)
+                except (ValueError, TypeError) as e:
+                    state['invalid'] += 1
+                    logger.warning("Registro inválido ignorado: %s", e,
+                                   extra={'record': state['position'] + offset + 1})
+                    continue
+                if data['email'] in prepared:
+                    state['skipped'] += 1
+                    continue
+                prepared[data['email']] = (data, password)
+
+            existing = _existing_emails(db, prepared) if prepared else set()
+            state['skipped'] += len(existing)
+            pending = [entry for email, entry in prepared.items() if email not in existing]
+
+            # bcrypt em paralelo: é a etapa dominante (~0,2s por senha com 12 rounds)
+            to_hash = [(data, password) for data, password in pending if password]
+            hashes = pool.map(_hash_password, [password for _, password in to_hash], [rounds] * len(to_hash),
+                              chunksize=max(1, len(to_hash) // (4 * workers)))
+            rejected = set()
+            for (data, _), (password_hash, error) in zip(to_hash, hashes):
+                if error:
+                    rejected.add(data['uid'])
+                    logger.warning("Senha rejeitada pelo bcrypt: %s", error, extra={'email': data['email']})
+                data['password_hash'] = password_hash
+            state['invalid'] += len(rejected)
+            pending = [(data, password) for data, password in pending if data['uid'] not in rejected]
+
+            if pending:
+                pending = _commit_users(db, pending)
+                deltas = {}
+                for data, _ in pending:
+                    for field, delta in user_deltas(None, User.from_dict(data)).items():
+                        deltas[field] = deltas.get(field, 0) + delta
+                # Um incremento dos contadores agregados por lote
+                try:
+                    user_stats.increment(deltas)
+                except Exception as e:
+                    logger.warning("Erro ao atualizar estatísticas agregadas: %s", e)
+
+            state['skipped'] += len(prepared) - len(existing) - len(rejected) - len(pending)
+            state['imported'] += len(pending)
+            state['position'] += len(chunk)
+            if checkpoint is not None:
+                checkpoint.save(state)
+
+            if report:
+                elapsed = time.perf_counter() - started
+                report(state, (state['position'] - processed_at_start) / elapsed if elapsed else 0.0)
+
+    return state
@@ -0,0 +1,121 @@
+"""
+Estatísticas agregadas de usuários em contadores distribuídos (sharded)
+
+Os totais (usuários, vinculados ao Google, com senha e cadastros por dia)
+são mantidos incrementalmente por User.save, sem varrer a coleção `users`.
+Cada incremento vai para um shard sorteado da coleção `stats_shards`, de
+modo que escritas simultâneas não disputam o mesmo documento; a leitura
+soma os N shards com um único get_all.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from app.config import Config
+
+COLLECTION = 'stats_shards'
+TOTAL_USERS = 'total_users'
+GOOGLE_USERS = 'google_users'
+PASSWORD_USERS = 'password_users'
+SIGNUPS_PREFIX = 'signups_'
+
+def signups_field(day):
+    """Campo do contador de cadastros de um dia (signups_YYYYMMDD)"""
+    return SIGNUPS_PREFIX + day.strftime('%Y%m%d')
+
+def _signup_day(created_at):
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at.date() if isinstance(created_at, datetime) else datetime.utcnow().date()
+
+def user_deltas(previous, user):
+    """Variações dos contadores ao gravar `user`.
+
+    `previous` é (has_password, vinculado ao Google) do documento carregado,
+    ou None para um usuário novo.
+    """
+    linked = user.google_id is not None
+    if previous is None:
+        deltas = {TOTAL_USERS: 1, signups_field(_signup_day(user.created_at)): 1}
+        if linked:
+            deltas[GOOGLE_USERS] = 1
+        if user.has_password:
+            deltas[PASSWORD_USERS] = 1
+        return deltas
+    had_password, was_linked = previous
+    deltas = {}
+    if bool(user.has_password) != bool(had_password):
+        deltas[PASSWORD_USERS] = 1 if user.has_password else -1
+    if linked != was_linked:
+        deltas[GOOGLE_USERS] = 1 if linked else -1
+    return deltas
+
+class ShardedCounters:
+    """Contadores com N shards: escrita em um shard aleatório, leitura somando todos"""
+
+    def __init__(self, collection=COLLECTION, shards=10):
+        self.collection = collection
+        self.shards = max(1, shards)
+
+    def _shard_refs(self, db):
+        return [db.collection(self.collection).document(str(i)) for i in range(self.shards)]
+
+    def increment(self, deltas):
+        """Aplicar {campo: variação} atomicamente em um shard sorteado"""
+        if not deltas:
+            return
+        from app import get_db
+        from app.firestore_client import call_firestore, increment
+        db = get_db()
+        ref = db.collection(self.collection).document(str(random.randrange(self.shards)))
+        call_firestore(ref.set, {field: increment(db, delta) for field, delta in deltas.items()},
+                       merge=True, idempotent=False)
+
+    def totals(self):
+        """Somar todos os shards: N leituras em uma chamada, independente do número de usuários"""
+        from app import get_db
+        from app.firestore_client import call_firestore
+        db = get_db()
+        refs = self._shard_refs(db)
+        docs = call_firestore(lambda **options: list(db.get_all(refs, **options)))
+        totals = {}
+        for doc in docs:
+            for field, value in (doc.to_dict() or {}).items():
+                if isinstance(value, (int, float)):
+                    totals[field] = totals.get(field, 0) + value
+        return totals
+
+    def reset(self, values):
+        """Substituir os contadores por `values` (shard 0) e zerar os demais shards"""
+        from app import get_db
+        from app.firestore_client import call_firestore
+        db = get_db()
+        batch = db.batch()
+        for i, ref in enumerate(self._shard_refs(db)):
+            batch.set(ref, values if i == 0 else {})
+        call_firestore(batch.commit)
+
+user_stats = ShardedCounters(shards=Config.STATS_COUNTER_SHARDS)
+
+def summarize(totals, days=7, today=None):
+    """Totais para o painel de administração, com cadastros dos últimos `days` dias"""
+    today = today or datetime.utcnow().date()
+    signups = {}
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        signups[day.isoformat()] = totals.get(signups_field(day), 0)
+    return {
+        'total_users': totals.get(TOTAL_USERS, 0),
+        'google_users': totals.get(GOOGLE_USERS, 0),
+        'password_users': totals.get(PASSWORD_USERS, 0),
+        'signups_per_day': signups
+    }
+
+def recount(users):
+    """Recalcular os contadores a partir de uma varredura completa de `users`"""
+    values = {}
+    for user in users:
+        for field, delta in user_deltas(None, user).items():
+            values[field] = values.get(field, 0) + delta
+    user_stats.reset(values)
+    return values
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Compression benchmark: CPU time vs. bytes saved
+
+Compresses a large JSON payload (a user listing) through
+CompressionMiddleware at several gzip levels and brotli qualities, both as
+one body and as a streamed NDJSON response, and reports output size,
+ratio, CPU time per MB and throughput.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.compression import CompressionMiddleware, brotli  # noqa: E402
+
+def make_users(count):
+    return [{
+        'uid': f'{i:08x}-3d4b-4a55-9a8e-0c7d2b1e4f60',
+        'email': f'user{i}@example.com',
+        'name': f'User Number {i}',
+        'has_password': i % 3 != 0,
+        'google_id': i % 2 == 0,
+        'created_at': f'2024-01-{i % 28 + 1:02d}T12:00:00'
+    } for i in range(count)]
+
+def wsgi_app(chunks, mimetype):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', mimetype)])
+        return iter(chunks)
+    return app
+
+def run(middleware, encoding):
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': encoding}
+    start = time.process_time()
+    size = sum(len(part) for part in middleware(environ, lambda status, headers, exc_info=None: None))
+    return size, time.process_time() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Response compression benchmark")
+    parser.add_argument('--users', type=int, default=20000, help="Users in the payload (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per setting, best is kept (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    users = make_users(args.users)
+    payloads = {
+        'json': ([json.dumps({'users': users}).encode('utf-8')], 'application/json'),
+        'ndjson stream': ([(json.dumps(u) + '\n').encode('utf-8') for u in users], 'application/x-ndjson'),
+    }
+    settings = [('gzip', level) for level in (1, 6, 9)]
+    if brotli is not None:
+        settings += [('br', quality) for quality in (1, 4, 11)]
+
+    print(f"{'payload':<15}{'encoding':<10}{'level':>6}{'in KB':>10}{'out KB':>10}{'ratio':>8}"
+          f"{'CPU ms':>9}{'ms/MB':>8}{'MB/s':>8}")
+    for name, (chunks, mimetype) in payloads.items():
+        raw_size = sum(len(c) for c in chunks)
+        for encoding, level in settings:
+            middleware = CompressionMiddleware(
+                wsgi_app(chunks, mimetype), level=level if encoding == 'gzip' else 6,
+                brotli_quality=level if encoding == 'br' else 4
+            )
+            size, cpu = min((run(middleware, encoding) for _ in range(args.repeat)), key=lambda r: r[1])
+            mb = raw_size / 1e6
+            print(f"{name:<15}{encoding:<10}{level:>6}{raw_size / 1024:>10.0f}{size / 1024:>10.0f}"
+                  f"{raw_size / size:>8.1f}{cpu * 1000:>9.1f}{cpu * 1000 / mb:>8.1f}{mb / cpu if cpu else 0:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Sync vs cooperative (gevent) gunicorn workers under I/O latency
+
+Starts gunicorn twice against the local simulator with the same worker
+count: once with sync workers (optionally threaded) and once with gevent
+workers. FIRESTORE_SIM_LATENCY_MS adds a fixed delay to every simulated
+Firestore call and USER_CACHE_TTL=0 makes every protected request read
+the user document, so requests spend most of their time waiting on I/O.
+A sync worker holds one request per thread while it waits; a gevent
+worker keeps serving other requests, so throughput should scale with the
+load generator concurrency instead of the thread count.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import test_api  # noqa: E402
+from benchmarks.worker_scaling import pss_mb, seed_users, wait_ready  # noqa: E402
+
+def run_mode(worker_class, args, workdir, run_id):
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        GUNICORN_BIND=f"127.0.0.1:{args.port}",
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_THREADS=str(args.threads if worker_class == 'sync' else 1),
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_WORKER_CONNECTIONS=str(args.connections),
+        FIRESTORE_SIM_LATENCY_MS=str(args.latency),
+        USER_CACHE_TTL='0',
+        MICROCACHE_TTL='0'
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'run:app'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_ready(base_url):
+            raise RuntimeError(f"gunicorn with {worker_class} workers did not start")
+        test_api.BASE_URL = base_url
+        stats, elapsed = test_api.run_load_test(args.concurrency, args.duration, args.mix, args.users, run_id=run_id)
+        memory = pss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(v for values in stats.latencies.values() for v in values)
+    return {
+        'mode': worker_class if worker_class != 'sync' else f"sync x{args.threads}",
+        'rps': len(latencies) / elapsed,
+        'p50': test_api.percentile(latencies, 50),
+        'p99': test_api.percentile(latencies, 99),
+        'errors': sum(stats.errors.values()),
+        'pss_mb': memory
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync vs gevent gunicorn workers benchmark")
+    parser.add_argument('--workers', type=int, default=2, help="Workers per mode (default: %(default)s)")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per sync worker (default: %(default)s)")
+    parser.add_argument('--connections', type=int, default=1000, help="Connections per gevent worker (default: %(default)s)")
+    parser.add_argument('--latency', type=float, default=50, help="Simulated Firestore latency in ms (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=100, help="Load generator concurrency (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=15, help="Seconds per mode (default: %(default)s)")
+    parser.add_argument('--mix', default="protected=9,public=1", help="Request mix (default: %(default)s)")
+    parser.add_argument('--users', type=int, default=10, help="Seeded users (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=5099, help="Port for gunicorn (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        run_id = int(time.time())
+        seed_users(workdir, args.users, run_id)
+        for worker_class in ('sync', 'gevent'):
+            results.append(run_mode(worker_class, args, workdir, run_id))
+
+    print(f"\nworkers={args.workers}  latency={args.latency}ms  concurrency={args.concurrency}")
+    print(f"{'mode':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'PSS MB':>10}")
+    for r in results:
+        print(f"{r['mode']:>10}{r['rps']:>10.1f}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}{r['pss_mb']:>10.1f}")
+    return 1 if any(r['errors'] for r in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Offline check of the Firestore deadline and retry policy
+
+Drives call_firestore against the local simulator with a FaultProfile and a
+RetryPolicy whose sleep is recorded instead of slept, and checks that
+transient errors are retried with bounded backoff, that the per-call
+deadline raises, and that non-transient errors are not retried. With
+--client it also checks that create_tuned_client passes the configured
+channel options to gRPC (needs google-cloud-firestore, no network).
+Exits with status 1 when a check fails.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.firestore_client import FirestoreSettings, RetryPolicy, call_firestore  # noqa: E402
+from app.firestore_simulator import (  # noqa: E402
+    FaultProfile, MockAlreadyExists, MockDeadlineExceeded, MockFirestoreClient, MockServiceUnavailable
+)
+
+class RecordingSleep:
+    def __init__(self):
+        self.delays = []
+
+    def __call__(self, delay):
+        self.delays.append(delay)
+
+def make_client(workdir, faults):
+    client = MockFirestoreClient(os.path.join(workdir, 'firestore_retry_check.json'))
+    client.collection('users').document('u1').set({'uid': 'u1', 'email': 'u1@example.com'})
+    # Faults only apply after the document exists
+    client.faults = faults
+    return client
+
+def check(name, condition, detail=''):
+    status = 'ok  ' if condition else 'FAIL'
+    print(f"[{status}] {name}{' - ' + detail if detail else ''}")
+    return condition
+
+def check_retry(workdir, calls):
+    """50% of gets fail: with 5 attempts almost every call should succeed"""
+    sleep = RecordingSleep()
+    policy = RetryPolicy(attempts=5, initial=0.1, maximum=0.4, sleep=sleep)
+    client = make_client(workdir, FaultProfile(error_rate={'get': 0.5}, seed=7))
+    ref = client.collection('users').document('u1')
+    successes = 0
+    for _ in range(calls):
+        try:
+            call_firestore(ref.get, policy=policy, timeout=1.0)
+            successes += 1
+        except MockServiceUnavailable:
+            pass
+    ok = check("transient errors are retried", successes >= calls * 0.9, f"{successes}/{calls} succeeded")
+    ok &= check("backoff was used", len(sleep.delays) > 0, f"{len(sleep.delays)} sleeps")
+    ok &= check("backoff is capped", max(sleep.delays, default=0) <= 0.4,
+                f"max delay {max(sleep.delays, default=0):.3f}s")
+    return ok
+
+def check_exhausted(workdir):
+    """Every get fails: the error surfaces after exactly `attempts` calls"""
+    sleep = RecordingSleep()
+    policy = RetryPolicy(attempts=4, sleep=sleep)
+    client = make_client(workdir, FaultProfile(error_rate={'get': 1.0}))
+    ref = client.collection('users').document('u1')
+    try:
+        call_firestore(ref.get, policy=policy, timeout=1.0)
+        raised = False
+    except MockServiceUnavailable:
+        raised = True
+    ok = check("persistent failure is raised", raised)
+    ok &= check("attempts are respected", len(sleep.delays) == 3, f"{len(sleep.delays) + 1} attempts")
+    return ok
+
+def check_deadline(workdir):
+    """A 200 ms get with a 20 ms deadline raises DeadlineExceeded on every attempt"""
+    sleep = RecordingSleep()
+    policy = RetryPolicy(attempts=2, sleep=sleep)
+    client = make_client(workdir, FaultProfile(latency_ms={'get': 200.0}))
+    ref = client.collection('users').document('u1')
+    try:
+        call_firestore(ref.get, policy=policy, timeout=0.02)
+        raised = False
+    except MockDeadlineExceeded:
+        raised = True
+    ok = check("deadline is enforced", raised)
+    ok &= check("deadline errors are retried", len(sleep.delays) == 1)
+    return ok
+
+def check_non_idempotent(workdir):
+    """Increment writes retry UNAVAILABLE but not a deadline (the write may have been applied)"""
+    sleep = RecordingSleep()
+    policy = RetryPolicy(attempts=2, sleep=sleep)
+    ref = make_client(workdir, FaultProfile(latency_ms={'set': 200.0})).collection('users').document('u1')
+    try:
+        call_firestore(ref.update, {'login_count': 1}, policy=policy, idempotent=False, timeout=0.02)
+        raised = False
+    except MockDeadlineExceeded:
+        raised = True
+    ok = check("non-idempotent writes are not retried after a deadline", raised and not sleep.delays)
+
+    ref = make_client(workdir, FaultProfile(error_rate={'set': 1.0})).collection('users').document('u1')
+    try:
+        call_firestore(ref.update, {'login_count': 1}, policy=policy, idempotent=False)
+    except MockServiceUnavailable:
+        pass
+    ok &= check("non-idempotent writes are retried when unavailable", len(sleep.delays) == 1)
+    return ok
+
+def check_not_retried(workdir):
+    """create() on an existing document is not a transient error"""
+    sleep = RecordingSleep()
+    policy = RetryPolicy(attempts=3, sleep=sleep)
+    client = make_client(workdir, None)
+    ref = client.collection('users').document('u1')
+    try:
+        call_firestore(ref.create, {'uid': 'u1'}, policy=policy)
+        raised = False
+    except MockAlreadyExists:
+        raised = True
+    return check("non-transient errors are not retried", raised and not sleep.delays)
+
+def check_client_options():
+    """create_tuned_client hands the configured options to the gRPC channel"""
+    from google.api_core import grpc_helpers
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore as gcloud_firestore
+    from app.firestore_client import create_tuned_client
+
+    recorded = {}
+    original = grpc_helpers.create_channel
+
+    def spy(target, *args, **kwargs):
+        recorded.update(dict(kwargs.get('options') or ()))
+        return original(target, *args, **kwargs)
+
+    grpc_helpers.create_channel = spy
+    try:
+        settings = FirestoreSettings()
+        client = create_tuned_client('demo-project', AnonymousCredentials(), settings)
+        client._firestore_api
+    finally:
+        grpc_helpers.create_channel = original
+    expected = dict(settings.channel_options())
+    return check(f"channel options applied (google-cloud-firestore {gcloud_firestore.__version__})",
+                 all(recorded.get(key) == value for key, value in expected.items()),
+                 f"keepalive_time_ms={recorded.get('grpc.keepalive_time_ms')}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Firestore deadline/retry check")
+    parser.add_argument('--calls', type=int, default=200, help="Calls in the retry check (default: %(default)s)")
+    parser.add_argument('--client', action='store_true', help="Also check create_tuned_client channel options")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        ok = check_retry(workdir, args.calls)
+        ok &= check_exhausted(workdir)
+        ok &= check_deadline(workdir)
+        ok &= check_non_idempotent(workdir)
+        ok &= check_not_retried(workdir)
+    if args.client:
+        ok &= check_client_options()
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
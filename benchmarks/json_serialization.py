@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+JSON serialization benchmark for API responses
+
+Compares the cost per response of jsonify with the stdlib provider, the
+orjson provider, and the orjson provider with the cached public user
+fragment (app/serializers.py), using a /auth/profile-shaped payload.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import jsonify  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.json_provider import OrjsonProvider, orjson  # noqa: E402
+from app.models import User  # noqa: E402
+from app.serializers import public_user, user_view  # noqa: E402
+
+def profile_payload(user, user_data):
+    return {
+        'success': True,
+        'data': {
+            'user': user_data
+        }
+    }
+
+def bench(app, provider_class, user, use_fragment, number):
+    app.json = provider_class(app)
+    with app.test_request_context():
+        def run():
+            user_data = public_user(user) if use_fragment else user_view(user)
+            return jsonify(profile_payload(user, user_data)).get_data()
+        run()
+        seconds = timeit.timeit(run, number=number)
+    return seconds / number * 1e6
+
+def bench_body(user, use_fragment, number):
+    """Only the orjson encoding of the payload, without jsonify/Response overhead"""
+    def run():
+        user_data = public_user(user) if use_fragment else user_view(user)
+        return orjson.dumps(profile_payload(user, user_data))
+    run()
+    return timeit.timeit(run, number=number) / number * 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON serialization benchmark")
+    parser.add_argument('--number', type=int, default=50000, help="Responses per variant (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    user = User(uid='6f1c2a9e-3d4b-4a55-9a8e-0c7d2b1e4f60', email='benchmark.user@example.com',
+                name='Benchmark User', password_hash='$2b$12$' + 'x' * 53, has_password=True, version=1)
+
+    results = [('stdlib jsonify', bench(app, DefaultJSONProvider, user, False, args.number))]
+    if orjson is not None:
+        results.append(('orjson jsonify', bench(app, OrjsonProvider, user, False, args.number)))
+        results.append(('orjson + cached user fragment', bench(app, OrjsonProvider, user, True, args.number)))
+        results.append(('body only: orjson dumps', bench_body(user, False, args.number)))
+        results.append(('body only: cached fragment', bench_body(user, True, args.number)))
+    else:
+        print("orjson not installed: only the stdlib provider was measured")
+
+    print(f"{'variant':<32}{'us/response':>12}{'saved':>10}")
+    for name, micros in results:
+        # Body-only variants are compared with each other, the rest with stdlib
+        baseline = results[3][1] if name.startswith('body only') else results[0][1]
+        print(f"{name:<32}{micros:>12.2f}{baseline - micros:>9.2f}us")
+
+if __name__ == '__main__':
+    main()
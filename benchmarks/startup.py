@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for create_app, driven by `python -X importtime`
+
+Runs the app factory in fresh interpreters, reports import and factory
+time, the slowest imports and whether the google-cloud stack was loaded.
+Exits with status 1 when a --max-ms or --forbid gate fails.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+done = time.perf_counter()
+print('STARTUP %.3f %.3f' % ((imported - start) * 1000, (done - imported) * 1000))
+print('MODULES ' + ' '.join(sorted(sys.modules)))
+"""
+
+def run_once(workdir):
+    """Run one cold start and return (import_ms, factory_ms, modules, importtime lines)"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    import_ms = factory_ms = 0.0
+    modules = set()
+    for line in result.stdout.splitlines():
+        if line.startswith('STARTUP '):
+            _, import_ms, factory_ms = line.split()
+            import_ms, factory_ms = float(import_ms), float(factory_ms)
+        elif line.startswith('MODULES '):
+            modules = set(line.split()[1:])
+    timings = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|', 1).split('|')]
+        timings.append((int(cumulative_us), int(self_us), name))
+    return import_ms, factory_ms, modules, timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="Number of cold starts (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=10, help="Slowest imports to show (default: %(default)s)")
+    parser.add_argument('--max-ms', type=float, help="Fail if median import + factory time exceeds this")
+    parser.add_argument('--forbid', action='append', default=[],
+                        help="Fail if this module is imported at startup (repeatable, e.g. google.cloud.firestore)")
+    parser.add_argument('--workdir', default=ROOT, help="Working directory (controls credentials lookup)")
+    args = parser.parse_args(argv)
+
+    totals = []
+    for _ in range(args.runs):
+        import_ms, factory_ms, modules, timings = run_once(args.workdir)
+        totals.append(import_ms + factory_ms)
+        print(f"import {import_ms:8.1f} ms   create_app {factory_ms:8.1f} ms   modules {len(modules)}")
+
+    median = statistics.median(totals)
+    print(f"\nmedian cold start: {median:.1f} ms over {args.runs} runs")
+
+    print("\nslowest imports (cumulative, last run):")
+    for cumulative_us, self_us, name in sorted(timings, reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    google_loaded = sorted(m for m in modules if m.startswith(('google.cloud', 'firebase_admin', 'grpc')))
+    print(f"\ngoogle-cloud stack loaded: {'yes (' + str(len(google_loaded)) + ' modules)' if google_loaded else 'no'}")
+    for module in args.forbid:
+        if module in modules:
+            print(f"FAIL: forbidden module imported at startup: {module}")
+            failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL: median cold start {median:.1f} ms exceeds {args.max_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+User model memory and construction benchmark
+
+Reports the memory held per User object (slotted model vs the previous
+layout with a per-instance __dict__), the time to build a User from a
+Firestore document with from_dict vs the keyword __init__, and the peak
+memory allocated while serving an authenticated /api/protected request
+through the Flask test client (local simulator).
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import tempfile
+import timeit
+import tracemalloc
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.models import User  # noqa: E402
+
+class DictUser:
+    """Previous layout: the same fields plus a _stored_flags tuple in an instance __dict__"""
+
+def user_document(i):
+    return {
+        'uid': str(uuid.uuid4()),
+        'email': f"user{i}@example.com",
+        'password_hash': '$2b$12$' + 'x' * 53,
+        'google_id': None,
+        'name': f"User {i}",
+        'created_at': datetime(2024, 1, 1).isoformat(),
+        'has_password': True,
+        'version': 3,
+        'login_count': 7,
+        'last_login': datetime(2024, 6, 1).isoformat(),
+        'roles': ['user'],
+        'roles_version': 0
+    }
+
+def dict_user(data):
+    user = DictUser()
+    for name in User.__slots__:
+        setattr(user, name, data.get(name.lstrip('_')))
+    user.roles = list(data['roles'])
+    user._stored_flags = (data['has_password'], data['google_id'] is not None)
+    user._stored = data
+    return user
+
+def bytes_per_object(factory, documents):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(data) for data in documents]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Minus the list holding the objects
+    size = (after - before - sys.getsizeof(objects)) / len(objects)
+    del objects
+    return size
+
+def construction_us(documents, number):
+    data = documents[0]
+    kwargs = {key: value for key, value in data.items()}
+    from_dict = min(timeit.repeat(lambda: User.from_dict(data), number=number, repeat=5)) / number * 1e6
+    keywords = min(timeit.repeat(lambda: User(**kwargs), number=number, repeat=5)) / number * 1e6
+    return from_dict, keywords
+
+def request_peak_kb(requests):
+    """Peak traced memory per authenticated request, in KB"""
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    response = client.post('/auth/register', json={'email': 'bench@example.com', 'password': 'secret123'})
+    token = response.get_json()['data']['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    for _ in range(50):
+        client.get('/api/protected', headers=headers)
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(requests):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        client.get('/api/protected', headers=headers)
+        peaks.append((tracemalloc.get_traced_memory()[1] - current) / 1024)
+    tracemalloc.stop()
+    return statistics.median(peaks)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="User model memory and construction benchmark")
+    parser.add_argument('--objects', type=int, default=100000, help="Users built for the memory figure (default: %(default)s)")
+    parser.add_argument('--number', type=int, default=100000, help="Constructions per timing (default: %(default)s)")
+    parser.add_argument('--requests', type=int, default=500, help="Requests for the allocation figure (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    documents = [user_document(i) for i in range(args.objects)]
+    slotted = bytes_per_object(User.from_dict, documents)
+    with_dict = bytes_per_object(dict_user, documents)
+    from_dict, keywords = construction_us(documents, args.number)
+    peak = request_peak_kb(args.requests)
+
+    print(f"{'':<34}{'value':>12}")
+    print(f"{'bytes/User (__slots__)':<34}{slotted:>12.0f}")
+    print(f"{'bytes/User (__dict__)':<34}{with_dict:>12.0f}")
+    print(f"{'from_dict (us)':<34}{from_dict:>12.2f}")
+    print(f"{'User(**fields) (us)':<34}{keywords:>12.2f}")
+    print(f"{'peak KB per /api/protected':<34}{peak:>12.1f}")
+    print(f"\n{args.objects} cached users: {slotted * args.objects / 2**20:.1f} MB slotted vs "
+          f"{with_dict * args.objects / 2**20:.1f} MB with __dict__ (excluding the documents)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
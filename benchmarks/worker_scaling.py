@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Gunicorn worker-count scaling benchmark
+
+For each worker count, starts gunicorn (gunicorn.conf.py, preload on by
+default) against the local simulator, runs the test_api.py load generator
+and reports throughput, p50/p99 latency and the proportional memory (PSS)
+of the master plus workers. Users are seeded into the simulator data file
+before gunicorn starts; since each worker opens its own simulator after
+fork, every worker sees the same seeded users.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import test_api  # noqa: E402
+
+def seed_users(workdir, count, run_id):
+    """Write the load-test users straight into the simulator data file"""
+    from app.firestore_simulator import MockFirestoreClient
+    from flask_bcrypt import generate_password_hash
+
+    client = MockFirestoreClient(os.path.join(workdir, 'firestore_local_data.json'))
+    # Same hash for every user: bcrypt cost is paid once
+    password_hash = generate_password_hash(test_api.LOAD_USER_PASSWORD).decode('utf-8')
+    for i in range(count):
+        uid = str(uuid.uuid4())
+        client.collection('users').document(uid).set({
+            'uid': uid,
+            'email': f"load.{run_id}.{i}@example.com",
+            'password_hash': password_hash,
+            'google_id': None,
+            'name': f"Load User {i}",
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'has_password': True
+        })
+
+def process_tree(pid):
+    """PIDs of a process and all of its descendants"""
+    pids = [pid]
+    for child in pids:
+        try:
+            for task in os.listdir(f'/proc/{child}/task'):
+                with open(f'/proc/{child}/task/{task}/children') as f:
+                    pids.extend(int(p) for p in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+def pss_mb(pid):
+    """Total proportional set size (MB) of a process tree, Linux only"""
+    total_kb = 0
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024.0
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/public", timeout=1).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+def run_workers(workers, args, workdir, run_id):
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        GUNICORN_BIND=f"127.0.0.1:{args.port}",
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_PRELOAD='true' if args.preload else 'false'
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'run:app'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_ready(base_url):
+            raise RuntimeError(f"gunicorn with {workers} workers did not start")
+        test_api.BASE_URL = base_url
+        stats, elapsed = test_api.run_load_test(args.concurrency, args.duration, args.mix, args.users, run_id=run_id)
+        memory = pss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(v for values in stats.latencies.values() for v in values)
+    errors = sum(stats.errors.values())
+    return {
+        'workers': workers,
+        'rps': len(latencies) / elapsed,
+        'p50': test_api.percentile(latencies, 50),
+        'p99': test_api.percentile(latencies, 99),
+        'errors': errors,
+        'pss_mb': memory
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gunicorn worker-count scaling benchmark")
+    parser.add_argument('--workers', default='1,2,4', help="Comma-separated worker counts (default: %(default)s)")
+    parser.add_argument('--threads', type=int, default=1, help="Threads per worker (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=16, help="Load generator concurrency (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=15, help="Seconds per worker count (default: %(default)s)")
+    parser.add_argument('--mix', default=test_api.LOAD_DEFAULT_MIX, help="Request mix (default: %(default)s)")
+    parser.add_argument('--users', type=int, default=10, help="Seeded users (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=5099, help="Port for gunicorn (default: %(default)s)")
+    parser.add_argument('--no-preload', dest='preload', action='store_false', help="Disable preload_app")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        run_id = int(time.time())
+        seed_users(workdir, args.users, run_id)
+        for workers in [int(w) for w in args.workers.split(',')]:
+            results.append(run_workers(workers, args, workdir, run_id))
+
+    print(f"\npreload={'on' if args.preload else 'off'}  threads={args.threads}  concurrency={args.concurrency}")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'PSS MB':>10}")
+    for r in results:
+        print(f"{r['workers']:>8}{r['rps']:>10.1f}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}{r['pss_mb']:>10.1f}")
+    return 1 if any(r['errors'] for r in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
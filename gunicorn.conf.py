@@ -0,0 +1,73 @@
+# Configuração do Gunicorn
+#
+# Uso: gunicorn run:app  (este arquivo é carregado automaticamente)
+#
+# Com preload_app o app é importado uma vez no processo mestre e as páginas
+# de memória são compartilhadas pelos workers via fork. O cliente do banco
+# (canal gRPC do Firestore ou simulador local) nunca é compartilhado: cada
+# worker cria o seu no primeiro uso, depois do fork.
+#
+# Com GUNICORN_WORKER_CLASS=gevent os workers são cooperativos: cada
+# requisição roda em uma greenlet e as esperas de I/O (Firestore, OAuth do
+# Google) liberam o worker para as outras, até GUNICORN_WORKER_CONNECTIONS
+# requisições simultâneas por processo (ver app/cooperative.py).
+
+import multiprocessing
+import os
+import sys
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gevent':
+    # O patch precisa vir antes do preload do app: locks, filas e threads
+    # criados na importação dos módulos têm de ser os do gevent
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        # Canal gRPC do Firestore no loop do gevent
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        pass
+
+# O app fica ao lado deste arquivo; importado só depois do monkey patching
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app.config import uses_simulator  # noqa: E402
+
+# Só localhost por padrão; use GUNICORN_BIND=0.0.0.0:5000 para expor
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+# O simulador local guarda o estado em cada processo (usuários, reservas de
+# e-mail, revogações e contadores gravados em um worker não são vistos pelos
+# outros), então sem Firestore real o padrão é um único worker
+simulator = uses_simulator()
+workers = int(os.environ.get('GUNICORN_WORKERS', 1 if simulator else multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+def on_starting(server):
+    if simulator and workers > 1:
+        server.log.warning(
+            "%d workers com o simulador local do Firestore: cada worker tem os próprios dados, "
+            "e registros feitos em um não aparecem nos outros (use GUNICORN_WORKERS=1)", workers
+        )
+
+def post_fork(server, worker):
+    """Descartar qualquer cliente do banco herdado do processo mestre"""
+    from app import reset_db
+    reset_db()
+
+def post_worker_init(worker):
+    """Com FIREBASE_EAGER_INIT, conectar ao banco antes de aceitar requisições"""
+    from app.config import Config
+    if Config.FIREBASE_EAGER_INIT:
+        from app import get_db
+        get_db()
+
+def worker_exit(server, worker):
+    """Gravar as estatísticas de login e os eventos de auditoria pendentes antes de o worker sair"""
+    from app.login_stats import login_stats
+    from app.audit import audit_log
+    login_stats.flush()
+    audit_log.flush()
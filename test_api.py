@@ -3,10 +3,14 @@
 Automated test script for Flask Firebase PoC API
 """
 
+import argparse
 import requests
 import json
+import random
+import threading
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Configuration
@@ -17,6 +21,11 @@ TEST_USER = {
     "password": "password123456"
 }
 
+# Load test defaults
+LOAD_DEFAULT_MIX = "login=1,protected=3,public=6"
+LOAD_USER_PASSWORD = "loadtest123456"
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
 class Colors:
     GREEN = '\033[92m'
     RED = '\033[91m'
@@ -76,6 +85,217 @@ def test_endpoint(method, endpoint, headers=None, data=None, expected_status=200
         print_error(f"Unexpected error: {str(e)}")
         return None
 
+def parse_mix(mix):
+    """Parse a request mix such as 'login=1,protected=3,public=6'"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in LOAD_SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}'. Use: {', '.join(LOAD_SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("Request mix must have at least one positive weight")
+    return weights
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+class LoadStats:
+    """Thread-safe collector of per-scenario latencies and errors"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.status_codes = {}
+
+    def record(self, scenario, latency_ms, status_code, ok):
+        with self._lock:
+            self.latencies.setdefault(scenario, []).append(latency_ms)
+            if not ok:
+                self.errors[scenario] = self.errors.get(scenario, 0) + 1
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+class LoadUserPool:
+    """Pre-registered users shared by the load workers"""
+
+    def __init__(self, users):
+        self.users = users
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def pick(self):
+        return random.choice(self.users)
+
+    def token_for(self, user):
+        with self._lock:
+            return self._tokens.get(user['email'])
+
+    def set_token(self, user, token):
+        with self._lock:
+            self._tokens[user['email']] = token
+
+def prepare_user_pool(size, run_id):
+    """Register (or log in) the users used by the load test"""
+    pool = LoadUserPool([])
+    session = requests.Session()
+    for i in range(size):
+        user = {
+            "name": f"Load User {i}",
+            "email": f"load.{run_id}.{i}@example.com",
+            "password": LOAD_USER_PASSWORD
+        }
+        response = session.post(f"{BASE_URL}/auth/register", json=user)
+        if response.status_code == 409:
+            response = session.post(f"{BASE_URL}/auth/login", json={
+                "email": user["email"],
+                "password": user["password"]
+            })
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f"Could not prepare user {user['email']}: status {response.status_code}")
+        pool.users.append(user)
+        pool.set_token(user, response.json().get('data', {}).get('token'))
+    return pool
+
+def scenario_public(session, pool):
+    return session.get(f"{BASE_URL}/api/public")
+
+def scenario_login(session, pool):
+    user = pool.pick()
+    response = session.post(f"{BASE_URL}/auth/login", json={
+        "email": user["email"],
+        "password": user["password"]
+    })
+    if response.status_code == 200:
+        pool.set_token(user, response.json().get('data', {}).get('token'))
+    return response
+
+def scenario_protected(session, pool):
+    user_token = pool.token_for(pool.pick())
+    return session.get(f"{BASE_URL}/api/protected", headers={"Authorization": f"Bearer {user_token}"})
+
+LOAD_SCENARIOS = {
+    'public': scenario_public,
+    'login': scenario_login,
+    'protected': scenario_protected,
+}
+
+def load_worker(deadline, weights, pool, stats):
+    """Issue requests back to back until the deadline"""
+    session = requests.Session()
+    names = list(weights)
+    name_weights = [weights[name] for name in names]
+    while time.perf_counter() < deadline:
+        scenario = random.choices(names, weights=name_weights)[0]
+        start = time.perf_counter()
+        try:
+            response = LOAD_SCENARIOS[scenario](session, pool)
+            status_code = response.status_code
+            ok = status_code < 400
+        except requests.exceptions.RequestException:
+            status_code = 'conn-error'
+            ok = False
+        stats.record(scenario, (time.perf_counter() - start) * 1000.0, status_code, ok)
+
+def print_histogram(latencies):
+    """Print a latency histogram with fixed millisecond buckets"""
+    counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for value in latencies:
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+
+    total = len(latencies) or 1
+    labels = [f"<= {bound} ms" for bound in LATENCY_BUCKETS_MS] + [f"> {LATENCY_BUCKETS_MS[-1]} ms"]
+    for label, count in zip(labels, counts):
+        if count:
+            bar = '#' * max(1, int(40 * count / total))
+            print(f"  {label:>12} {count:>8} {bar}")
+
+def print_load_report(stats, elapsed):
+    """Print throughput, error rate and latency percentiles"""
+    print_header("LOAD TEST REPORT")
+    all_latencies = []
+    total_errors = 0
+
+    print(f"{'scenario':<12}{'requests':>10}{'errors':>8}{'rps':>10}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for scenario in sorted(stats.latencies):
+        latencies = sorted(stats.latencies[scenario])
+        errors = stats.errors.get(scenario, 0)
+        all_latencies.extend(latencies)
+        total_errors += errors
+        print(f"{scenario:<12}{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>10.1f}"
+              f"{percentile(latencies, 50):>9.1f}{percentile(latencies, 90):>9.1f}"
+              f"{percentile(latencies, 99):>9.1f}{latencies[-1]:>9.1f}")
+
+    all_latencies.sort()
+    total = len(all_latencies)
+    print()
+    print_info(f"Duration: {elapsed:.1f}s")
+    print_info(f"Total requests: {total}")
+    print_info(f"Throughput: {total / elapsed:.1f} req/s")
+    print_info(f"Error rate: {(100.0 * total_errors / total) if total else 0.0:.2f}%")
+    print_info(f"Latency ms p50={percentile(all_latencies, 50):.1f} "
+               f"p90={percentile(all_latencies, 90):.1f} "
+               f"p99={percentile(all_latencies, 99):.1f}")
+    print_info("Status codes: " + ', '.join(f"{code}={count}" for code, count in sorted(stats.status_codes.items(), key=str)))
+    print()
+    print_histogram(all_latencies)
+    return total_errors
+
+def run_load_test(concurrency, duration, mix, users, run_id=None):
+    """Run the concurrent load generator against BASE_URL
+
+    Returns the collected LoadStats and the elapsed time in seconds.
+    """
+    print_header("LOAD TEST - FLASK FIREBASE POC")
+    weights = parse_mix(mix)
+    print_info(f"Target: {BASE_URL}")
+    print_info(f"Concurrency: {concurrency}, duration: {duration}s, mix: {mix}, users: {users}")
+
+    print_test("Preparing user pool")
+    try:
+        pool = prepare_user_pool(users, run_id if run_id is not None else int(time.time()))
+    except requests.exceptions.ConnectionError:
+        print_error(f"Connection error with {BASE_URL}")
+        print_info("Make sure the Flask application is running")
+        sys.exit(1)
+    except RuntimeError as e:
+        print_error(str(e))
+        sys.exit(1)
+    print_success(f"{len(pool.users)} users ready")
+
+    print_test(f"Running load for {duration}s")
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(load_worker, deadline, weights, pool, stats) for _ in range(concurrency)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    print_load_report(stats, elapsed)
+    return stats, elapsed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Automated tests and load generator for the Flask Firebase PoC API")
+    parser.add_argument('--base-url', default=BASE_URL, help="API base URL (default: %(default)s)")
+    parser.add_argument('--load', action='store_true', help="Run the concurrent load generator instead of the functional tests")
+    parser.add_argument('--concurrency', type=int, default=10, help="Number of concurrent workers (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=30, help="Load duration in seconds (default: %(default)s)")
+    parser.add_argument('--mix', default=LOAD_DEFAULT_MIX, help="Request mix weights (default: %(default)s)")
+    parser.add_argument('--users', type=int, default=10, help="Number of pre-registered users (default: %(default)s)")
+    return parser.parse_args(argv)
+
 def main():
     print_header("AUTOMATED TEST - FLASK FIREBASE POC")
     
@@ -136,6 +356,7 @@ def main():
     
     print_success("Login successful")
     login_token = login_response.get('data', {}).get('token')
+    refresh_token = login_response.get('data', {}).get('refresh_token')
     print_info(f"New token: {login_token[:50]}...")
     
     # Test 4: Protected endpoint with token
@@ -211,6 +432,41 @@ def main():
     else:
         print_error("Invalid token should be rejected")
     
+    # Test 10: Refresh token rotation
+    print_header("TEST 10: REFRESH TOKEN")
+    print_test("Exchanging refresh token for new tokens")
+    refresh_response = test_endpoint('POST', '/auth/refresh', data={"refresh_token": refresh_token})
+    
+    if refresh_response and refresh_response.get('success'):
+        print_success("Token refreshed successfully")
+        refreshed = refresh_response.get('data', {})
+        print_test("Reusing the rotated refresh token")
+        reuse_response = test_endpoint('POST', '/auth/refresh', data={"refresh_token": refresh_token}, expected_status=401)
+        if reuse_response and not reuse_response.get('success'):
+            print_success("Reused refresh token correctly rejected")
+        else:
+            print_error("Reused refresh token should be rejected")
+    else:
+        print_error("Token refresh failed")
+        refreshed = {}
+    
+    # Test 11: Logout
+    print_header("TEST 11: LOGOUT")
+    print_test("Logging out and revoking the token")
+    logout_response = test_endpoint('POST', '/auth/logout', headers=headers,
+                                    data={"refresh_token": refreshed.get('refresh_token')})
+    
+    if logout_response and logout_response.get('success'):
+        print_success("Logout successful")
+        revoked_response = test_endpoint('GET', '/api/protected', headers=headers, expected_status=401)
+        if revoked_response and not revoked_response.get('success'):
+            print_success("Revoked token correctly rejected")
+            print_info(f"Message: {revoked_response.get('message')}")
+        else:
+            print_error("Revoked token should be rejected")
+    else:
+        print_error("Logout failed")
+    
     # Final summary
     print_header("TEST SUMMARY")
     print_success("All main tests executed!")
@@ -221,9 +477,15 @@ def main():
     print_info("  ✓ JWT authentication")
     print_info("  ✓ Route protection")
     print_info("  ✓ Token validation")
+    print_info("  ✓ Refresh token rotation and logout")
     print_info("  ✓ Error handling")
     
     print(f"\n{Colors.GREEN}{Colors.BOLD}🎉 TESTS COMPLETED SUCCESSFULLY! 🎉{Colors.END}\n")
 
 if __name__ == "__main__":
+    args = parse_args()
+    BASE_URL = args.base_url.rstrip('/')
+    if args.load:
+        stats, _ = run_load_test(args.concurrency, args.duration, args.mix, args.users)
+        sys.exit(1 if any(stats.errors.values()) else 0)
     main()